@@ -1,12 +1,33 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import json
 import os
 import calendar
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import uuid
+import itertools
+from collections import ChainMap
+import shutil
+import threading
+import time
+import atexit
+import logging
+import tempfile
+import contextlib
+from io import BytesIO
+from PIL import Image
 from streamlit_option_menu import option_menu
 import hashlib
+try:
+    import orjson # Optional faster JSON parser/serializer; stdlib json is used when it is missing
+except ImportError:
+    orjson = None
+try:
+    import numba # Optional: JIT-compiled attendance counting for large datasets
+except ImportError:
+    numba = None
 
 # ======================
 # DATA MANAGEMENT
@@ -35,38 +56,335 @@ LEAVE_DATA_FILE = os.path.join(DATA_DIR, "leave_data.json")
 def load_data(filename, default_value={}):
     """Load data from JSON file, returning a default value if file is empty or corrupted."""
     if os.path.exists(filename):
-        with open(filename, 'r') as f:
+        with open(filename, 'rb') as f: # Both parsers take bytes directly, skipping a text decode pass
             try:
                 # Attempt to load, if file is empty, json.load will raise an error
                 content = f.read()
                 if content:
-                    return json.loads(content)
+                    return orjson.loads(content) if orjson is not None else json.loads(content)
                 else:
                     return default_value
-            except json.JSONDecodeError:
+            except json.JSONDecodeError: # orjson.JSONDecodeError subclasses this
                 st.warning(f"Error decoding JSON from {filename}. File might be corrupted. Re-initializing with default value.")
                 return default_value
     return default_value
 
+def dump_json_bytes(data):
+    """Serialize data as 2-space indented JSON, matching json.dump(indent=2) layout"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS) # Non-str keys are stringified like json.dump does
+    return json.dumps(data, indent=2).encode()
+
 def save_data(data, filename):
     """Save data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    with open(filename, 'wb') as f:
+        f.write(dump_json_bytes(data))
+
+PASSWORD_HASH_ITERATIONS = 100_000
+
+def hash_password(password):
+    """Hash a password with salted PBKDF2-HMAC-SHA256; stored as 'pbkdf2_sha256$iterations$salt$hash'"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+logger = logging.getLogger(__name__)
+
+# Debounced background writes: {filename: (data, time the entry was last scheduled)}
+_pending_writes = {}
+_pending_writes_lock = threading.Lock()
+_pending_writes_thread = None
+SAVE_DEBOUNCE_SECONDS = 0.2
+
+def _write_json_atomic(data, filename):
+    """Write to a temp file and swap it in so readers never see a half-written JSON file"""
+    # Unique temp file per call: every session (and the other dashboards' writers) are threads of one process
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dump_json_bytes(data))
+        os.replace(tmp_filename, filename)
+    finally:
+        with contextlib.suppress(FileNotFoundError): # Already renamed into place unless the write failed
+            os.remove(tmp_filename)
+
+def flush_pending_writes(min_age=0.0):
+    """Write every pending entry that has been idle for at least min_age seconds"""
+    now = time.monotonic()
+    with _pending_writes_lock:
+        due = {filename: data for filename, (data, scheduled_at) in _pending_writes.items() if now - scheduled_at >= min_age}
+        for filename in due:
+            del _pending_writes[filename]
+    for filename, data in due.items():
+        try:
+            _write_json_atomic(data, filename)
+        except Exception: # Disk full, permissions, dict mutated mid-serialization, ...; keep the worker alive
+            logger.exception("Saving %s failed; will retry", filename)
+            # Re-queue for the next tick unless a newer save of the same file is already pending
+            with _pending_writes_lock:
+                _pending_writes.setdefault(filename, (data, now))
+
+def _pending_writes_worker():
+    while True:
+        time.sleep(0.25)
+        flush_pending_writes(min_age=SAVE_DEBOUNCE_SECONDS)
+
+def schedule_save(data, filename):
+    """Queue data to be saved by the background writer; bursts of saves to the same file coalesce into one write"""
+    global _pending_writes_thread
+    with _pending_writes_lock:
+        _pending_writes[filename] = (data, time.monotonic())
+        if _pending_writes_thread is None:
+            _pending_writes_thread = threading.Thread(target=_pending_writes_worker, name="pending-writes", daemon=True)
+            _pending_writes_thread.start()
+
+atexit.register(flush_pending_writes)
+
+def stripped_text_input(label, **kwargs):
+    """st.text_input that trims surrounding whitespace, only building a new string when there is any to trim"""
+    value = st.text_input(label, **kwargs)
+    return value.strip() if value and (value[0].isspace() or value[-1].isspace()) else value
+
+def parse_date(value):
+    """Parse a stored 'YYYY-MM-DD' string into a date; None for missing or malformed values"""
+    try:
+        return date.fromisoformat(value) if value else None
+    except (ValueError, TypeError):
+        return None
 
 # Grade levels and sections
 GRADE_LEVELS = ["Nursery", "LKG", "UKG"] + [f"Grade {i}" for i in range(1, 11)]
 CLASS_SECTIONS = ["A", "B", "C", "D"]
+PRIMARY_GRADES = frozenset({"Nursery", "LKG", "UKG"}) # Grades without sections
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-", "Unknown")
+SUBJECTS = ("Mathematics", "Science", "English", "History", "Geography", "Computer Science", "Arts", "Physical Education", "Other", "Administration")
+
+# Every class with sections, computed once at import since it depends only on the constants above
+FULL_CLASS_LIST = tuple(
+    grade if grade in PRIMARY_GRADES else f"{grade}{section}"
+    for grade in GRADE_LEVELS
+    for section in (("",) if grade in PRIMARY_GRADES else CLASS_SECTIONS)
+)
+FULL_CLASS_LIST_SORTED = tuple(sorted(FULL_CLASS_LIST))
 
 def get_full_class_list():
-    """Generate complete list of classes with sections"""
-    classes = []
-    for grade in GRADE_LEVELS:
-        if grade in ["Nursery", "LKG", "UKG"]:
-            classes.append(grade)
-        else:
-            for section in CLASS_SECTIONS:
-                classes.append(f"{grade}{section}")
-    return classes
+    """Return the complete list of classes with sections"""
+    return FULL_CLASS_LIST
+
+def generate_sample_students():
+    """Generate sample student records for every class, grouped by class name"""
+    class_names = get_full_class_list()
+    counts = np.array([2 if class_name in PRIMARY_GRADES else 3 for class_name in class_names])
+    classes = np.repeat(np.array(class_names), counts)
+    serials = np.concatenate([np.arange(1, n + 1) for n in counts]).astype(str)
+    serials_2 = np.char.zfill(serials, 2)
+    add = np.char.add
+
+    sample_df = pd.DataFrame({
+        "id": [str(uuid.uuid4()) for _ in range(classes.size)], # Unique internal ID
+        # Ensures unique admission numbers across sample data
+        "admission_no": add(add("ADM", np.char.replace(np.char.replace(classes, " ", ""), "Grade", "")), np.char.zfill(serials, 3)).tolist(),
+        "name": add(add(add("Student ", serials), " "), classes).tolist(),
+        "roll_no": serials.tolist(),
+        "class": classes.tolist(),
+        "dob": "2010-01-01", # Example fixed date
+        "date_of_joining": "2023-09-01", # Example fixed date
+        "date_of_tc": None,
+        "adhar_number": add("1234567890", serials_2).tolist(),
+        "father_name": add(add(add("Father ", serials), " "), classes).tolist(),
+        "mother_name": add(add(add("Mother ", serials), " "), classes).tolist(),
+        "parent_email": add(add(add(add("parent", serials), "_"), np.char.replace(classes, " ", "_")), "@example.com").tolist(),
+        "parent_phone": add("98765432", serials_2).tolist(),
+        "address": add(add(add(serials, " School Road, "), classes), " City").tolist(),
+        "emergency_contact": add(add(add("Emergency Contact ", serials), " - 99988877"), serials_2).tolist(),
+        "contact_number": add("91234567", serials_2).tolist(),
+        "blood_group": "O+",
+        "financial_status": "Paid",
+        "passport_photo_path": None
+    })
+    return {
+        class_name: class_df.to_dict(orient='records')
+        for class_name, class_df in sample_df.groupby('class', sort=False)
+    }
+
+def build_admission_index(students_by_class):
+    """Map every admission number to its (class_name, position) in the students data"""
+    return {
+        student['admission_no']: (class_name, idx)
+        for class_name, students_in_class in students_by_class.items()
+        for idx, student in enumerate(students_in_class)
+        if 'admission_no' in student
+    }
+
+# Process-wide counter so cache keys built from data versions never collide across sessions
+_DATA_VERSION_COUNTER = itertools.count()
+
+def bump_data_version(key):
+    """Mark a session_state dataset as changed so cached views derived from it are rebuilt"""
+    st.session_state[f"{key}_version"] = next(_DATA_VERSION_COUNTER)
+
+def get_data_version(key):
+    if f"{key}_version" not in st.session_state:
+        bump_data_version(key)
+    return st.session_state[f"{key}_version"]
+
+# Version-keyed builders: every save bumps the version and orphans the old entry, so each cache is capped
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_teacher_options(version, _teachers):
+    """Return ({"Name (username)": id}, sorted selectbox labels, {username: id} in username order) for the teacher pickers"""
+    teacher_options = {f"{t['name']} ({t['username']})": t['id'] for t in _teachers.values()}
+    teacher_ids_by_username = dict(sorted((t['username'], t['id']) for t in _teachers.values() if 'username' in t))
+    return teacher_options, sorted(teacher_options), teacher_ids_by_username
+
+def get_teacher_options():
+    """Teacher picker data held in session_state and reused by every tab until the teachers version changes"""
+    version = get_data_version('teachers')
+    memo = st.session_state.get('_teacher_options_memo')
+    if memo is None or memo[0] != version:
+        # st.cache_data hands out a fresh copy per call; keep one per session so reruns reuse the same objects
+        memo = (version, build_teacher_options(version, st.session_state.teachers))
+        st.session_state['_teacher_options_memo'] = memo
+    return memo[1]
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_photo_thumbnail(path, mtime):
+    """Decode a stored photo at reduced size and return it as JPEG bytes; mtime keys the cache so replaced photos refresh"""
+    with Image.open(path) as im:
+        im.draft("RGB", (300, 300)) # Lets the JPEG decoder skip full-resolution IDCT work
+        im.thumbnail((150, 150))
+        buf = BytesIO()
+        im.convert("RGB").save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+# Long pickers only send this many matches to the browser; users narrow them with a search box
+MAX_PICKER_OPTIONS = 50
+
+def filter_picker_options(labels, query, limit=MAX_PICKER_OPTIONS):
+    """Return the first `limit` labels containing query (case-insensitive)"""
+    query = query.strip().lower()
+    matches = (label for label in labels if query in label.lower())
+    return list(itertools.islice(matches, limit))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_student_options(version, _students_by_class):
+    """Return ({"Name (admission_no)": id}, sorted selectbox labels, {id: student}) for the student pickers"""
+    students_by_id = {s['id']: s for students_in_class in _students_by_class.values() for s in students_in_class}
+    student_options = {f"{s['name']} ({s['admission_no']})": student_id for student_id, s in students_by_id.items()}
+    return student_options, sorted(student_options), students_by_id
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_class_students_frame(version, class_name, _students_by_class):
+    """Roster table for one class; rebuilt only when the students version changes"""
+    return pd.DataFrame.from_records(_students_by_class.get(class_name, []), columns=['admission_no', 'name', 'roll_no', 'dob'])
+
+# Explicit Arrow schema for payment history rows (record ids are not displayed)
+FEE_RECORD_SCHEMA = pa.schema([
+    ("type", pa.string()), ("amount", pa.float64()), ("method", pa.string()), ("date", pa.string()), ("description", pa.string())
+])
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_fee_records_frame(version, student_id, _fee_records):
+    """Payment history for one student as an Arrow table; rebuilt only when the fee data version changes"""
+    return pa.Table.from_pylist(list(_fee_records.values()), schema=FEE_RECORD_SCHEMA)
+
+EVENT_DISPLAY_COLUMNS = ("type", "title", "description", "date_posted", "event_date", "event_time", "venue")
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_events_frame(version, _event_notice_data):
+    """Events/notices table (without ids); rebuilt only when the events version changes"""
+    return pd.DataFrame.from_records(list(_event_notice_data.values()), columns=list(EVENT_DISPLAY_COLUMNS))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_admission_options(version, _admission_index):
+    """Sorted admission numbers for the student picker; rebuilt only when the students version changes"""
+    return sorted(_admission_index)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_event_title_options(version, _event_notice_data):
+    """Return {"Title (date posted)": event_id} in title order for the delete picker"""
+    return dict(sorted((f"{e['title']} ({e['date_posted']})", event_id) for event_id, e in _event_notice_data.items()))
+
+# Fallback values for edit-form fields missing from older records (looked up through a ChainMap)
+STUDENT_FORM_DEFAULTS = {
+    "name": "", "roll_no": "", "dob": None, "date_of_joining": None, "date_of_tc": None, "adhar_number": "",
+    "contact_number": "", "parent_name": "", "father_name": "", "mother_name": "", "parent_email": "",
+    "parent_phone": "", "address": "", "emergency_contact": "", "blood_group": "Unknown",
+    "financial_status": "", "passport_photo_path": None
+}
+TEACHER_FORM_DEFAULTS = {
+    "name": "", "subject": "Other", "email": "", "phone": "", "designation": "", "join_date": None,
+    "resignation_date": None, "epf_number": "", "esi_number": "", "payroll": 0.0, "is_admin": False
+}
+
+# Labels for the required add-form fields, in the same order as the values checked on submit
+REQUIRED_STUDENT_FIELD_LABELS = (
+    "Admission Number", "Full Name", "Class", "Date of Birth", "Date of Joining", "Parent Name",
+    "Father's Name", "Mother's Name", "Parent Email", "Parent Phone", "Emergency Contact"
+)
+REQUIRED_TEACHER_FIELD_LABELS = ("Username", "Password", "Full Name", "Subject", "Designation", "Joining Date")
+
+# Columns shown in the admin tables (password hash and internal IDs are never displayed)
+STUDENT_DISPLAY_COLUMNS = (
+    "admission_no", "name", "roll_no", "class_name_display", "dob", "date_of_joining",
+    "father_name", "mother_name", "parent_email", "parent_phone", "contact_number",
+    "emergency_contact", "blood_group", "financial_status"
+)
+TEACHER_DISPLAY_COLUMNS = (
+    "username", "name", "subject", "email", "phone", "join_date", "designation",
+    "resignation_date", "epf_number", "esi_number", "payroll", "is_admin"
+)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_students_frame(version, _students_by_class):
+    """Flatten {class: [students]} into a DataFrame; rebuilt only when the students version changes"""
+    return pd.DataFrame.from_records([
+        {**student, "class_name_display": class_name_key}
+        for class_name_key, students_in_class in _students_by_class.items()
+        for student in students_in_class
+    ], columns=list(STUDENT_DISPLAY_COLUMNS))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_teachers_frame(version, _teachers):
+    """Teachers table for display; rebuilt only when the teachers version changes"""
+    return pd.DataFrame.from_records(list(_teachers.values()), columns=list(TEACHER_DISPLAY_COLUMNS))
+
+# Compact in-memory encoding of attendance statuses (the JSON files keep the strings other modules read)
+ATTENDANCE_STATUS_CODES = {"Absent": 0, "Present": 1, "Late": 2, "Excused": 3}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def encode_attendance_statuses(version, _attendance_data):
+    """Flatten {teacher: {date: {class: {student: status}}}} into one int8 array of status codes (-1 for unknown)"""
+    return np.fromiter(
+        (ATTENDANCE_STATUS_CODES.get(status, -1) for teacher_attn in _attendance_data.values() for date_attn in teacher_attn.values()
+         for class_attn in date_attn.values() for status in class_attn.values()),
+        dtype=np.int8
+    )
+
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def _count_status_code(status_codes, code):
+        count = 0
+        for i in numba.prange(status_codes.size):
+            if status_codes[i] == code:
+                count += 1
+        return count
+else:
+    def _count_status_code(status_codes, code):
+        return np.count_nonzero(status_codes == code)
+
+def compute_attendance_totals(version, attendance_data):
+    """Return (present, recorded) counts from the encoded status array"""
+    status_codes = encode_attendance_statuses(version, attendance_data)
+    return int(_count_status_code(status_codes, ATTENDANCE_STATUS_CODES["Present"])), int(status_codes.size)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_submission_totals(version, _assignments_data):
+    """Return (submissions, assignments) counts over {teacher: [assignments]}"""
+    submission_counts = np.fromiter(
+        (len(assignment.get('submissions', [])) for teacher_assignments in _assignments_data.values() for assignment in teacher_assignments),
+        dtype=np.int32
+    )
+    return int(submission_counts.sum()), int(submission_counts.size)
 
 # ==============================================================================
 # SESSION STATE INITIALIZATION (Moved to top-level for immediate availability)
@@ -82,37 +400,17 @@ if 'students' not in st.session_state:
     st.session_state.students = load_data(STUDENT_DATA_FILE, default_value={})
     if not st.session_state.students:
         # Add some sample student data if the file is empty
-        sample_students = {}
-        for class_name in get_full_class_list():
-            sample_students[class_name] = []
-            num_students = 2 if class_name in ["Nursery", "LKG", "UKG"] else 3
-            for i in range(1, num_students + 1):
-                # Ensures unique admission numbers across sample data
-                admission_no = f"ADM{class_name.replace(' ', '').replace('Grade', '')}{i:03d}"
-                sample_students[class_name].append({
-                    "id": str(uuid.uuid4()), # Unique internal ID
-                    "admission_no": admission_no,
-                    "name": f"Student {i} {class_name}",
-                    "roll_no": f"{i}",
-                    "class": class_name,
-                    "dob": "2010-01-01", # Example fixed date
-                    "date_of_joining": "2023-09-01", # Example fixed date
-                    "date_of_tc": None,
-                    "adhar_number": f"1234567890{i:02d}",
-                    "father_name": f"Father {i} {class_name}",
-                    "mother_name": f"Mother {i} {class_name}",
-                    "parent_email": f"parent{i}_{class_name.replace(' ', '_')}@example.com",
-                    "parent_phone": f"98765432{i:02d}",
-                    "address": f"{i} School Road, {class_name} City",
-                    "emergency_contact": f"Emergency Contact {i} - 99988877{i:02d}",
-                    "contact_number": f"91234567{i:02d}",
-                    "blood_group": "O+",
-                    "financial_status": "Paid",
-                    "passport_photo_path": None
-                })
-        st.session_state.students = sample_students
+        st.session_state.students = generate_sample_students()
         save_data(st.session_state.students, STUDENT_DATA_FILE)
 
+# Admission number -> (class_name, index) lookup, kept in sync on add/delete
+if 'student_admission_index' not in st.session_state:
+    st.session_state.student_admission_index = build_admission_index(st.session_state.students)
+
+# Usernames already taken, kept in sync on add/delete
+if 'teacher_username_set' not in st.session_state:
+    st.session_state.teacher_username_set = {t['username'] for t in st.session_state.teachers.values() if 'username' in t}
+
 # Initialize other data files with empty structures if they don't exist
 # Use load_data with appropriate default values (dict for general, list for messages/resources/leave/assignments)
 data_files_to_initialize = {
@@ -128,12 +426,29 @@ data_files_to_initialize = {
     'event_notice_data': (EVENT_NOTICE_DATA_FILE, {}) # {event_id: event_object}
 }
 
+# Each save leaves the previous version's entry behind; cap the cache so stale parses are evicted
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_json_snapshot(file_path, mtime_ns, size):
+    """Parse a data file once per (mtime, size) so later session initializations (e.g. after logout) skip the JSON load.
+    Keyed on the file's current version, so writes from the teacher/parent modules are picked up; st.cache_data hands
+    every session its own deep copy, so in-place edits never reach the cache or other sessions."""
+    return load_data(file_path, default_value=None)
+
+def load_session_data(file_path):
+    """Current contents of a data file for a new session, or None if it is missing/empty/corrupted"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return _load_json_snapshot(file_path, stat.st_mtime_ns, stat.st_size)
+
 for session_key, (file_path, default_type) in data_files_to_initialize.items():
     if session_key not in st.session_state:
-        st.session_state[session_key] = load_data(file_path, default_value=default_type)
+        st.session_state[session_key] = load_session_data(file_path)
         if not st.session_state[session_key]: # If file was empty/corrupted, re-initialize with the default structure
-             st.session_state[session_key] = default_type
-        save_data(st.session_state[session_key], file_path)
+             st.session_state[session_key] = type(default_type)()
+        if not os.path.exists(file_path):
+            save_data(st.session_state[session_key], file_path)
 
 
 # ======================
@@ -155,7 +470,7 @@ def display_overview_dashboard():
     with col1:
         st.metric("Total Teachers", len(teachers))
     with col2:
-        total_students = sum(len(students) for students in students_by_class.values()) if students_by_class else 0
+        total_students = sum(map(len, students_by_class.values())) if students_by_class else 0
         st.metric("Total Students", total_students)
     with col3:
         total_classes = len(get_full_class_list())
@@ -164,29 +479,16 @@ def display_overview_dashboard():
     st.subheader("Key Performance Indicators")
 
     # Attendance Rate
-    total_present_attendance = 0
-    total_recorded_attendance = 0
     if attendance_data:
-        for teacher_attn in attendance_data.values():
-            for date_attn in teacher_attn.values():
-                for class_attn in date_attn.values():
-                    total_present_attendance += sum(1 for status in class_attn.values() if status == "Present")
-                    total_recorded_attendance += len(class_attn)
-
+        total_present_attendance, total_recorded_attendance = compute_attendance_totals(get_data_version('attendance_data'), attendance_data)
         overall_attendance_rate = (total_present_attendance / total_recorded_attendance * 100) if total_recorded_attendance > 0 else 0
         st.metric("Overall Attendance Rate", f"{overall_attendance_rate:.1f}%")
     else:
         st.info("No attendance data available for analytics.")
 
     # Assignment Completion Rate
-    total_assignments_for_kpi = 0
-    total_submissions_for_kpi = 0
     if assignments_data:
-        for teacher_assignments in assignments_data.values():
-            for assignment in teacher_assignments:
-                total_assignments_for_kpi += 1
-                total_submissions_for_kpi += len(assignment.get('submissions', []))
-
+        total_submissions_for_kpi, total_assignments_for_kpi = compute_submission_totals(get_data_version('assignments_data'), assignments_data)
         completion_rate = (total_submissions_for_kpi / total_assignments_for_kpi * 100) if total_assignments_for_kpi > 0 else 0
         st.metric("Overall Assignment Completion Rate", f"{completion_rate:.1f}%")
     else:
@@ -194,8 +496,10 @@ def display_overview_dashboard():
 
     # Fee Collection Status
     if fee_data:
-        total_expected_fees = sum(fee.get('amount_due', 0.0) for fee in fee_data.values())
-        total_collected_fees = sum(fee.get('amount_paid', 0.0) for fee in fee_data.values())
+        total_expected_fees = total_collected_fees = 0.0
+        for fee in fee_data.values():
+            total_expected_fees += fee.get('amount_due', 0.0)
+            total_collected_fees += fee.get('amount_paid', 0.0)
         collection_percentage = (total_collected_fees / total_expected_fees * 100) if total_expected_fees > 0 else 0
         st.metric("Fee Collection Percentage", f"{collection_percentage:.1f}%")
     else:
@@ -214,6 +518,7 @@ def manage_students_admin():
     st.header("🧑‍🎓 Student Management")
 
     student_data = st.session_state.students
+    admission_index = st.session_state.student_admission_index
 
     tab1, tab2 = st.tabs(["Add Student", "Manage Existing Students"])
 
@@ -222,42 +527,38 @@ def manage_students_admin():
         with st.form("add_student_admin", clear_on_submit=True):
             col1, col2 = st.columns(2)
             with col1:
-                student_admission_no = st.text_input("Student Admission Number*", help="Unique admission number for the student.").strip()
-                name = st.text_input("Full Name*", help="Full legal name of the student.").strip()
-                roll_no = st.text_input("Roll No.", help="Student's roll number in class (optional).").strip()
+                student_admission_no = stripped_text_input("Student Admission Number*", help="Unique admission number for the student.")
+                name = stripped_text_input("Full Name*", help="Full legal name of the student.")
+                roll_no = stripped_text_input("Roll No.", help="Student's roll number in class (optional).")
                 class_name = st.selectbox("Class*", get_full_class_list())
                 dob = st.date_input("Date of Birth*", max_value=datetime.today().date())
                 date_of_joining = st.date_input("Date of Joining*", max_value=datetime.today().date())
                 date_of_tc = st.date_input("Date of TC (Optional)", value=None, help="Date of Transfer Certificate issuance, if applicable.")
-                adhar_number = st.text_input("Aadhar Number (Optional)").strip()
-                contact_number = st.text_input("Student's Contact Number (Optional)").strip()
+                adhar_number = stripped_text_input("Aadhar Number (Optional)")
+                contact_number = stripped_text_input("Student's Contact Number (Optional)")
             with col2:
-                parent_name = st.text_input("Parent/Guardian Name*").strip()
-                father_name = st.text_input("Father's Name*").strip()
-                mother_name = st.text_input("Mother's Name*").strip()
-                parent_email = st.text_input("Parent Email*").strip()
-                parent_phone = st.text_input("Parent Phone*").strip()
+                parent_name = stripped_text_input("Parent/Guardian Name*")
+                father_name = stripped_text_input("Father's Name*")
+                mother_name = stripped_text_input("Mother's Name*")
+                parent_email = stripped_text_input("Parent Email*")
+                parent_phone = stripped_text_input("Parent Phone*")
                 address = st.text_area("Address").strip()
-                emergency_contact = st.text_input("Emergency Contact (Name & Number)*").strip()
-                blood_group = st.selectbox("Blood Group", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-", "Unknown"])
-                financial_status = st.text_input("Financial Status (e.g., Paid, Scholarship, Partial)").strip()
+                emergency_contact = stripped_text_input("Emergency Contact (Name & Number)*")
+                blood_group = st.selectbox("Blood Group", BLOOD_GROUPS)
+                financial_status = stripped_text_input("Financial Status (e.g., Paid, Scholarship, Partial)")
                 passport_photo = st.file_uploader("Upload Passport Photo (Optional)", type=["jpg", "jpeg", "png"])
 
             if st.form_submit_button("Add Student"):
-                required_fields = [student_admission_no, name, class_name, dob, date_of_joining, parent_name, father_name, mother_name, parent_email, parent_phone, emergency_contact]
-                if not all(required_fields) or not all(field for field in required_fields if isinstance(field, str)):
-                    st.error("Please fill all required fields (*)")
+                required_fields = (student_admission_no, name, class_name, dob, date_of_joining, parent_name, father_name, mother_name, parent_email, parent_phone, emergency_contact)
+                # Text inputs are already stripped, so a single truthiness pass catches blanks and unset dates
+                missing_fields = [label for label, value in zip(REQUIRED_STUDENT_FIELD_LABELS, required_fields) if not value]
+                if missing_fields:
+                    st.error(f"Please fill all required fields (*): {', '.join(missing_fields)}")
                 elif not (dob and date_of_joining): # Ensure date inputs are not None
                     st.error("Please select valid dates for Date of Birth and Date of Joining.")
                 else:
                     # Check if admission number already exists globally
-                    admission_exists = False
-                    for cls_students in student_data.values():
-                        if any(s.get('admission_no') == student_admission_no for s in cls_students):
-                            admission_exists = True
-                            break
-
-                    if admission_exists:
+                    if student_admission_no in admission_index:
                         st.error(f"Student Admission Number '{student_admission_no}' already exists. Please use a unique admission number.")
                     else:
                         if class_name not in student_data:
@@ -268,8 +569,9 @@ def manage_students_admin():
                             photo_filename = f"student_photo_{student_admission_no}_{passport_photo.name}"
                             photo_save_path = os.path.join(DATA_DIR, "attachments", photo_filename)
                             try:
+                                passport_photo.seek(0)
                                 with open(photo_save_path, "wb") as f:
-                                    f.write(passport_photo.getbuffer())
+                                    shutil.copyfileobj(passport_photo, f, 1024 * 1024) # Stream in 1 MiB chunks instead of one big buffer
                                 photo_path = photo_save_path
                                 st.success(f"Passport photo saved to {photo_save_path}")
                             except Exception as e:
@@ -299,49 +601,38 @@ def manage_students_admin():
                             "passport_photo_path": photo_path
                         }
                         student_data[class_name].append(new_student_record)
-                        save_data(student_data, STUDENT_DATA_FILE)
+                        admission_index[student_admission_no] = (class_name, len(student_data[class_name]) - 1)
+                        schedule_save(student_data, STUDENT_DATA_FILE)
+                        bump_data_version('students')
                         st.success(f"Student '{name}' (Admission No: {student_admission_no}) added successfully to {class_name}!")
                         st.rerun()
 
     with tab2:
         st.subheader("Manage Existing Students")
-        all_students_list = []
-        for class_name_key, students_in_class in student_data.items():
-            for student in students_in_class:
-                all_students_list.append({**student, "class_name_display": class_name_key})
+        df_students = build_students_frame(get_data_version('students'), student_data)
 
-        if not all_students_list:
+        if df_students.empty:
             st.info("No student records available.")
             return
 
-        df_students = pd.DataFrame(all_students_list)
-        # Select columns to display in the main table
-        display_columns = [
-            "admission_no", "name", "roll_no", "class_name_display", "dob", "date_of_joining",
-            "father_name", "mother_name", "parent_email", "parent_phone", "contact_number",
-            "emergency_contact", "blood_group", "financial_status"
-        ]
-        st.dataframe(df_students[display_columns], use_container_width=True)
+        st.dataframe(df_students, use_container_width=True)
 
         st.subheader("Edit or Delete Student")
 
         # Use admission number for selection
-        student_admission_numbers = [s['admission_no'] for s in all_students_list if 'admission_no' in s]
         student_to_manage_admission_no = st.selectbox(
             "Select Student by Admission Number to Edit/Delete",
-            [""] + sorted(student_admission_numbers), # Sort for better UX
+            build_admission_options(get_data_version('students'), admission_index), # Sorted for better UX
+            index=None,
+            placeholder="Select...",
             key="edit_delete_student_admission_no"
         )
 
         selected_student_obj = None
-        if student_to_manage_admission_no:
-            for cls_students in student_data.values():
-                for s in cls_students:
-                    if s.get('admission_no') == student_to_manage_admission_no:
-                        selected_student_obj = s
-                        break
-                if selected_student_obj:
-                    break
+        selected_location = admission_index.get(student_to_manage_admission_no)
+        if selected_location:
+            selected_class, selected_idx = selected_location
+            selected_student_obj = student_data[selected_class][selected_idx]
 
         if selected_student_obj:
             st.write(f"**Selected Student:** {selected_student_obj['name']} (Admission No: {selected_student_obj['admission_no']}) in {selected_student_obj['class']}")
@@ -350,103 +641,89 @@ def manage_students_admin():
 
             if action == "Edit":
                 st.subheader(f"Edit Details for {selected_student_obj['name']}")
+                student_fields = ChainMap(selected_student_obj, STUDENT_FORM_DEFAULTS)
                 with st.form(f"edit_student_form_{selected_student_obj['id']}"):
                     col1_edit, col2_edit = st.columns(2)
                     with col1_edit:
-                        new_name = st.text_input("Full Name", value=selected_student_obj.get('name', ''))
-                        new_roll_no = st.text_input("Roll No.", value=selected_student_obj.get('roll_no', ''))
-                        # Safely convert date strings to datetime.date objects for st.date_input
-                        try:
-                            default_dob = datetime.strptime(selected_student_obj['dob'], '%Y-%m-%d').date() if selected_student_obj.get('dob') else None
-                        except (ValueError, TypeError):
-                            default_dob = None
-                        try:
-                            default_joining_date = datetime.strptime(selected_student_obj['date_of_joining'], '%Y-%m-%d').date() if selected_student_obj.get('date_of_joining') else None
-                        except (ValueError, TypeError):
-                            default_joining_date = None
-                        try:
-                            default_tc_date = datetime.strptime(selected_student_obj['date_of_tc'], '%Y-%m-%d').date() if selected_student_obj.get('date_of_tc') else None
-                        except (ValueError, TypeError):
-                            default_tc_date = None
+                        new_name = st.text_input("Full Name", value=student_fields['name'])
+                        new_roll_no = st.text_input("Roll No.", value=student_fields['roll_no'])
+                        # Convert stored date strings to datetime.date objects for st.date_input
+                        default_dob = parse_date(student_fields['dob'])
+                        default_joining_date = parse_date(student_fields['date_of_joining'])
+                        default_tc_date = parse_date(student_fields['date_of_tc'])
 
                         new_dob = st.date_input("Date of Birth", value=default_dob or datetime.today().date(), max_value=datetime.today().date())
                         new_date_of_joining = st.date_input("Date of Joining", value=default_joining_date or datetime.today().date(), max_value=datetime.today().date())
                         new_date_of_tc = st.date_input("Date of TC (Optional)", value=default_tc_date)
-                        new_adhar_number = st.text_input("Aadhar Number (Optional)", value=selected_student_obj.get('adhar_number', ''))
-                        new_contact_number = st.text_input("Student's Contact Number (Optional)", value=selected_student_obj.get('contact_number', ''))
+                        new_adhar_number = st.text_input("Aadhar Number (Optional)", value=student_fields['adhar_number'])
+                        new_contact_number = st.text_input("Student's Contact Number (Optional)", value=student_fields['contact_number'])
                     with col2_edit:
-                        new_parent_name = st.text_input("Parent/Guardian Name", value=selected_student_obj.get('parent_name', ''))
-                        new_father_name = st.text_input("Father's Name", value=selected_student_obj.get('father_name', ''))
-                        new_mother_name = st.text_input("Mother's Name", value=selected_student_obj.get('mother_name', ''))
-                        new_parent_email = st.text_input("Parent Email", value=selected_student_obj.get('parent_email', ''))
-                        new_parent_phone = st.text_input("Parent Phone", value=selected_student_obj.get('parent_phone', ''))
-                        new_address = st.text_area("Address", value=selected_student_obj.get('address', ''))
-                        new_emergency_contact = st.text_input("Emergency Contact (Name & Number)", value=selected_student_obj.get('emergency_contact', ''))
-                        blood_group_options = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-", "Unknown"]
-                        new_blood_group = st.selectbox("Blood Group", blood_group_options, index=blood_group_options.index(selected_student_obj.get('blood_group', 'Unknown')))
-                        new_financial_status = st.text_input("Financial Status", value=selected_student_obj.get('financial_status', ''))
+                        new_parent_name = st.text_input("Parent/Guardian Name", value=student_fields['parent_name'])
+                        new_father_name = st.text_input("Father's Name", value=student_fields['father_name'])
+                        new_mother_name = st.text_input("Mother's Name", value=student_fields['mother_name'])
+                        new_parent_email = st.text_input("Parent Email", value=student_fields['parent_email'])
+                        new_parent_phone = st.text_input("Parent Phone", value=student_fields['parent_phone'])
+                        new_address = st.text_area("Address", value=student_fields['address'])
+                        new_emergency_contact = st.text_input("Emergency Contact (Name & Number)", value=student_fields['emergency_contact'])
+                        new_blood_group = st.selectbox("Blood Group", BLOOD_GROUPS, index=BLOOD_GROUPS.index(student_fields['blood_group']))
+                        new_financial_status = st.text_input("Financial Status", value=student_fields['financial_status'])
                         # For photo, allow new upload or display current
-                        current_photo_path = selected_student_obj.get('passport_photo_path')
+                        current_photo_path = student_fields['passport_photo_path']
                         if current_photo_path and os.path.exists(current_photo_path):
-                            st.image(current_photo_path, caption="Current Passport Photo", width=150)
+                            st.image(load_photo_thumbnail(current_photo_path, os.path.getmtime(current_photo_path)), caption="Current Passport Photo", width=150)
                             st.info("Upload a new photo to replace the current one.")
                         new_passport_photo = st.file_uploader("Upload New Passport Photo (Optional)", type=["jpg", "jpeg", "png"], key=f"edit_photo_{selected_student_obj['id']}")
 
                     if st.form_submit_button("Save Changes"):
-                        # Find the student to update by ID and class
-                        found_and_updated = False
-                        for idx, s in enumerate(student_data.get(selected_student_obj['class'], [])):
-                            if s['id'] == selected_student_obj['id']:
-                                student_data[selected_student_obj['class']][idx].update({
-                                    "name": new_name,
-                                    "roll_no": new_roll_no,
-                                    "dob": str(new_dob),
-                                    "date_of_joining": str(new_date_of_joining),
-                                    "date_of_tc": str(new_date_of_tc) if new_date_of_tc else None,
-                                    "adhar_number": new_adhar_number,
-                                    "parent_name": new_parent_name,
-                                    "father_name": new_father_name,
-                                    "mother_name": new_mother_name,
-                                    "parent_email": new_parent_email,
-                                    "parent_phone": new_parent_phone,
-                                    "address": new_address,
-                                    "emergency_contact": new_emergency_contact,
-                                    "contact_number": new_contact_number,
-                                    "blood_group": new_blood_group,
-                                    "financial_status": new_financial_status
-                                })
-                                if new_passport_photo:
-                                    photo_filename = f"student_photo_{selected_student_obj['admission_no']}_{new_passport_photo.name}"
-                                    photo_save_path = os.path.join(DATA_DIR, "attachments", photo_filename)
-                                    try:
-                                        with open(photo_save_path, "wb") as f:
-                                            f.write(new_passport_photo.getbuffer())
-                                        student_data[selected_student_obj['class']][idx]["passport_photo_path"] = photo_save_path
-                                        st.success(f"New passport photo saved to {photo_save_path}")
-                                    except Exception as e:
-                                        st.error(f"Error saving new photo: {e}")
-                                found_and_updated = True
-                                break
-                        if found_and_updated:
-                            save_data(student_data, STUDENT_DATA_FILE)
-                            st.success("Student details updated successfully!")
-                            st.rerun()
-                        else:
-                            st.error("Error: Student not found in data for update.")
+                        # The admission index already located the record, so update it in place
+                        selected_student_obj.update({
+                            "name": new_name,
+                            "roll_no": new_roll_no,
+                            "dob": str(new_dob),
+                            "date_of_joining": str(new_date_of_joining),
+                            "date_of_tc": str(new_date_of_tc) if new_date_of_tc else None,
+                            "adhar_number": new_adhar_number,
+                            "parent_name": new_parent_name,
+                            "father_name": new_father_name,
+                            "mother_name": new_mother_name,
+                            "parent_email": new_parent_email,
+                            "parent_phone": new_parent_phone,
+                            "address": new_address,
+                            "emergency_contact": new_emergency_contact,
+                            "contact_number": new_contact_number,
+                            "blood_group": new_blood_group,
+                            "financial_status": new_financial_status
+                        })
+                        if new_passport_photo:
+                            photo_filename = f"student_photo_{selected_student_obj['admission_no']}_{new_passport_photo.name}"
+                            photo_save_path = os.path.join(DATA_DIR, "attachments", photo_filename)
+                            try:
+                                new_passport_photo.seek(0)
+                                with open(photo_save_path, "wb") as f:
+                                    shutil.copyfileobj(new_passport_photo, f, 1024 * 1024) # Stream in 1 MiB chunks instead of one big buffer
+                                selected_student_obj["passport_photo_path"] = photo_save_path
+                                st.success(f"New passport photo saved to {photo_save_path}")
+                            except Exception as e:
+                                st.error(f"Error saving new photo: {e}")
+                        schedule_save(student_data, STUDENT_DATA_FILE)
+                        bump_data_version('students')
+                        st.success("Student details updated successfully!")
+                        st.rerun()
 
             elif action == "Delete":
                 st.warning(f"Are you sure you want to delete {selected_student_obj['name']} (Admission No: {selected_student_obj['admission_no']})?")
                 if st.button("Confirm Delete", key=f"confirm_delete_{selected_student_obj['id']}"):
-                    original_class = selected_student_obj['class']
-                    st.session_state.students[original_class] = [
-                        s for s in st.session_state.students[original_class]
-                        if s['id'] != selected_student_obj['id']
-                    ]
+                    del student_data[selected_class][selected_idx]
+                    del admission_index[selected_student_obj['admission_no']]
+                    # Students after the removed one shift down by one position
+                    for idx, s in enumerate(student_data[selected_class][selected_idx:], start=selected_idx):
+                        admission_index[s['admission_no']] = (selected_class, idx)
                     # If the class list becomes empty, remove the class entry
-                    if not st.session_state.students[original_class]:
-                        del st.session_state.students[original_class]
+                    if not student_data[selected_class]:
+                        del student_data[selected_class]
 
-                    save_data(st.session_state.students, STUDENT_DATA_FILE)
+                    schedule_save(st.session_state.students, STUDENT_DATA_FILE)
+                    bump_data_version('students')
                     st.success("Student deleted successfully!")
                     st.rerun()
         else:
@@ -466,36 +743,37 @@ def manage_teachers_admin():
         with st.form("add_teacher_admin", clear_on_submit=True):
             col1, col2 = st.columns(2)
             with col1:
-                username = st.text_input("Choose Username*", help="This will be the teacher's login username.").strip()
+                username = stripped_text_input("Choose Username*", help="This will be the teacher's login username.")
                 password = st.text_input("Choose Password*", type="password")
-                teacher_name = st.text_input("Full Name*").strip()
-                teacher_subject = st.selectbox("Subject*", ["Mathematics", "Science", "English", "History", "Geography", "Computer Science", "Arts", "Physical Education", "Other", "Administration"])
-                teacher_email = st.text_input("Email (Optional)").strip()
-                teacher_phone = st.text_input("Phone (Optional)").strip()
+                teacher_name = stripped_text_input("Full Name*")
+                teacher_subject = st.selectbox("Subject*", SUBJECTS)
+                teacher_email = stripped_text_input("Email (Optional)")
+                teacher_phone = stripped_text_input("Phone (Optional)")
             with col2:
-                designation = st.text_input("Designation*", help="e.g., Head of Department, Senior Teacher").strip()
+                designation = stripped_text_input("Designation*", help="e.g., Head of Department, Senior Teacher")
                 joining_date = st.date_input("Joining Date*", value=datetime.today().date())
                 resignation_date = st.date_input("Resignation Date (Optional)", value=None, help="Set if the teacher has resigned.")
-                epf_number = st.text_input("EPF Number (Optional)").strip()
-                esi_number = st.text_input("ESI Number (Optional)").strip()
+                epf_number = stripped_text_input("EPF Number (Optional)")
+                esi_number = stripped_text_input("ESI Number (Optional)")
                 payroll = st.number_input("Monthly Payroll (₹)", min_value=0.0, step=100.0, format="%.2f")
                 is_admin_checkbox = st.checkbox("Grant Admin Privileges", help="Only grant to trusted personnel.")
 
             if st.form_submit_button("Add Teacher"):
-                required_fields = [username, password, teacher_name, teacher_subject, designation, joining_date]
-                if not all(required_fields) or not all(field for field in required_fields if isinstance(field, str)):
-                    st.error("Please fill all required fields (*)")
+                required_fields = (username, password, teacher_name, teacher_subject, designation, joining_date)
+                missing_fields = [label for label, value in zip(REQUIRED_TEACHER_FIELD_LABELS, required_fields) if not value]
+                if missing_fields:
+                    st.error(f"Please fill all required fields (*): {', '.join(missing_fields)}")
                 elif not joining_date: # Ensure date input is not None
                     st.error("Please select a valid Joining Date.")
                 else:
-                    if any(t.get('username') == username for t in teachers.values()):
+                    if username in st.session_state.teacher_username_set:
                         st.error("Username already exists. Please choose a different one.")
                     else:
                         new_id = str(uuid.uuid4())
                         st.session_state.teachers[new_id] = {
                             "id": new_id,
                             "username": username,
-                            "password": hashlib.sha256(password.encode()).hexdigest(),
+                            "password": hash_password(password),
                             "name": teacher_name,
                             "subject": teacher_subject,
                             "email": teacher_email,
@@ -508,7 +786,9 @@ def manage_teachers_admin():
                             "payroll": payroll,
                             "is_admin": is_admin_checkbox
                         }
-                        save_data(st.session_state.teachers, TEACHER_DATA_FILE)
+                        st.session_state.teacher_username_set.add(username)
+                        schedule_save(st.session_state.teachers, TEACHER_DATA_FILE)
+                        bump_data_version('teachers')
                         st.success(f"Teacher '{teacher_name}' added successfully!")
                         st.rerun()
 
@@ -520,19 +800,17 @@ def manage_teachers_admin():
             st.info("No teacher records available.")
             return
 
-        df_teachers = pd.DataFrame(teachers_list)
-        # Don't display password hash and internal ID
-        df_teachers_display = df_teachers.drop(columns=['password', 'id'], errors='ignore')
+        df_teachers_display = build_teachers_frame(get_data_version('teachers'), teachers)
         st.dataframe(df_teachers_display, use_container_width=True)
 
         st.subheader("Edit or Delete Teacher")
         # Use username for selection as it's more human-readable and unique
-        teacher_usernames = sorted([t['username'] for t in teachers_list if 'username' in t])
-        selected_teacher_username = st.selectbox("Select Teacher by Username", [""] + teacher_usernames, key="edit_delete_teacher_username")
+        _, _, teacher_ids_by_username = get_teacher_options()
+        selected_teacher_username = st.selectbox("Select Teacher by Username", list(teacher_ids_by_username), index=None, placeholder="Select...", key="edit_delete_teacher_username")
 
         selected_teacher_obj = None
         if selected_teacher_username:
-            selected_teacher_obj = next((t for t in teachers_list if t.get('username') == selected_teacher_username), None)
+            selected_teacher_obj = teachers.get(teacher_ids_by_username.get(selected_teacher_username))
 
 
         if selected_teacher_obj:
@@ -542,31 +820,25 @@ def manage_teachers_admin():
 
             if action == "Edit":
                 st.subheader(f"Edit Details for {selected_teacher_obj['name']}")
+                teacher_fields = ChainMap(selected_teacher_obj, TEACHER_FORM_DEFAULTS)
                 with st.form(f"edit_teacher_form_{selected_teacher_obj['id']}"):
                     col1_edit, col2_edit = st.columns(2)
                     with col1_edit:
-                        new_name = st.text_input("Full Name", value=selected_teacher_obj.get('name', ''))
-                        subject_options = ["Mathematics", "Science", "English", "History", "Geography", "Computer Science", "Arts", "Physical Education", "Other", "Administration"]
-                        new_subject = st.selectbox("Subject", subject_options, index=subject_options.index(selected_teacher_obj.get('subject', 'Other')))
-                        new_email = st.text_input("Email", value=selected_teacher_obj.get('email', ''))
-                        new_phone = st.text_input("Phone", value=selected_teacher_obj.get('phone', ''))
+                        new_name = st.text_input("Full Name", value=teacher_fields['name'])
+                        new_subject = st.selectbox("Subject", SUBJECTS, index=SUBJECTS.index(teacher_fields['subject']))
+                        new_email = st.text_input("Email", value=teacher_fields['email'])
+                        new_phone = st.text_input("Phone", value=teacher_fields['phone'])
                         new_password_edit = st.text_input("New Password (leave blank to keep current)", type="password", key=f"new_pwd_edit_{selected_teacher_obj['id']}")
                     with col2_edit:
-                        new_designation = st.text_input("Designation", value=selected_teacher_obj.get('designation', ''))
-                        try:
-                            default_join_date = datetime.strptime(selected_teacher_obj['join_date'], '%Y-%m-%d').date() if selected_teacher_obj.get('join_date') else None
-                        except (ValueError, TypeError):
-                            default_join_date = None
-                        try:
-                            default_resignation_date = datetime.strptime(selected_teacher_obj['resignation_date'], '%Y-%m-%d').date() if selected_teacher_obj.get('resignation_date') else None
-                        except (ValueError, TypeError):
-                            default_resignation_date = None
+                        new_designation = st.text_input("Designation", value=teacher_fields['designation'])
+                        default_join_date = parse_date(teacher_fields['join_date'])
+                        default_resignation_date = parse_date(teacher_fields['resignation_date'])
                         new_joining_date = st.date_input("Joining Date", value=default_join_date or datetime.today().date())
                         new_resignation_date = st.date_input("Resignation Date (Optional)", value=default_resignation_date)
-                        new_epf_number = st.text_input("EPF Number", value=selected_teacher_obj.get('epf_number', ''))
-                        new_esi_number = st.text_input("ESI Number", value=selected_teacher_obj.get('esi_number', ''))
-                        new_payroll = st.number_input("Monthly Payroll (₹)", min_value=0.0, step=100.0, format="%.2f", value=float(selected_teacher_obj.get('payroll', 0.0)))
-                        new_is_admin = st.checkbox("Admin Privileges", value=selected_teacher_obj.get('is_admin', False))
+                        new_epf_number = st.text_input("EPF Number", value=teacher_fields['epf_number'])
+                        new_esi_number = st.text_input("ESI Number", value=teacher_fields['esi_number'])
+                        new_payroll = st.number_input("Monthly Payroll (₹)", min_value=0.0, step=100.0, format="%.2f", value=float(teacher_fields['payroll']))
+                        new_is_admin = st.checkbox("Admin Privileges", value=teacher_fields['is_admin'])
                     if st.form_submit_button("Save Changes"):
                         # Update the teacher data in session state
                         teacher_to_update = st.session_state.teachers.get(selected_teacher_obj['id'])
@@ -583,8 +855,9 @@ def manage_teachers_admin():
                             teacher_to_update['payroll'] = new_payroll
                             teacher_to_update['is_admin'] = new_is_admin
                             if new_password_edit:
-                                teacher_to_update['password'] = hashlib.sha256(new_password_edit.encode()).hexdigest()
-                            save_data(st.session_state.teachers, TEACHER_DATA_FILE)
+                                teacher_to_update['password'] = hash_password(new_password_edit)
+                            schedule_save(st.session_state.teachers, TEACHER_DATA_FILE)
+                            bump_data_version('teachers')
                             st.success("Teacher details updated successfully!")
                             st.rerun()
                         else:
@@ -593,7 +866,9 @@ def manage_teachers_admin():
                 st.warning(f"Are you sure you want to delete {selected_teacher_obj['name']} ({selected_teacher_obj['username']})?")
                 if st.button("Confirm Delete", key=f"confirm_delete_{selected_teacher_obj['id']}"):
                     del st.session_state.teachers[selected_teacher_obj['id']]
-                    save_data(st.session_state.teachers, TEACHER_DATA_FILE)
+                    st.session_state.teacher_username_set.discard(selected_teacher_obj['username'])
+                    schedule_save(st.session_state.teachers, TEACHER_DATA_FILE)
+                    bump_data_version('teachers')
                     st.success("Teacher deleted successfully!")
                     st.rerun()
         else:
@@ -605,14 +880,11 @@ def manage_classes_admin():
     class_data = st.session_state.class_data
     teachers = st.session_state.teachers
     students_by_class = st.session_state.students
-    all_teachers_list = list(teachers.values())
-    teacher_options = {f"{t['name']} ({t['username']})": t['id'] for t in all_teachers_list}
-    teacher_display_names = [""] + sorted(list(teacher_options.keys()))
+    teacher_options, teacher_display_names, _ = get_teacher_options()
     tab1, tab2 = st.tabs(["View/Edit Class Details", "Assign Class Teachers"])
     with tab1:
         st.subheader("View & Edit Class Details")
-        full_class_list = get_full_class_list()
-        selected_class = st.selectbox("Select Class", [""] + sorted(full_class_list), key="view_class_details_select")
+        selected_class = st.selectbox("Select Class", FULL_CLASS_LIST_SORTED, index=None, placeholder="Select...", key="view_class_details_select")
         if selected_class:
             # Initialize class data if not present
             if selected_class not in class_data:
@@ -639,19 +911,18 @@ def manage_classes_admin():
                     class_data[selected_class]["class_capacity"] = new_class_capacity
                     class_data[selected_class]["description"] = new_description
                     save_data(class_data, CLASS_DATA_FILE)
-                    st.success(f"Details for {selected_class} updated.")
-                    st.rerun()
+                    st.success(f"Details for {selected_class} updated.") # Nothing above the form shows these fields, so no rerun needed
             st.subheader("Students in this Class")
             if students_in_this_class:
-                df_class_students = pd.DataFrame(students_in_this_class)
-                st.dataframe(df_class_students[['admission_no', 'name', 'roll_no', 'dob']], use_container_width=True)
+                df_class_students = build_class_students_frame(get_data_version('students'), selected_class, students_by_class)
+                st.dataframe(df_class_students, use_container_width=True)
             else:
                 st.info(f"No students currently assigned to {selected_class}.")
         else:
             st.info("Select a class to view or edit its details.")
     with tab2:
         st.subheader("Assign Head Teachers to Classes")
-        class_to_assign = st.selectbox("Select Class to Assign Teacher", [""] + sorted(get_full_class_list()), key="assign_class_teacher_select")
+        class_to_assign = st.selectbox("Select Class to Assign Teacher", FULL_CLASS_LIST_SORTED, index=None, placeholder="Select...", key="assign_class_teacher_select")
         if class_to_assign:
             # Initialize class data if not present
             if class_to_assign not in class_data:
@@ -665,9 +936,9 @@ def manage_classes_admin():
             current_head_teacher_id = class_data[class_to_assign].get("head_teacher_id")
             current_head_teacher_name = teachers.get(current_head_teacher_id, {}).get("name", "Not assigned")
             st.info(f"Current Head Teacher for {class_to_assign}: **{current_head_teacher_name}**")
-            selected_teacher_display_name = st.selectbox("Select New Head Teacher", teacher_display_names, key="select_head_teacher")
+            selected_teacher_display_name = st.selectbox("Select New Head Teacher", teacher_display_names, index=None, placeholder="Select...", key="select_head_teacher")
             selected_teacher_id = teacher_options.get(selected_teacher_display_name)
-            if st.button(f"Assign {selected_teacher_display_name} as Head Teacher for {class_to_assign}"):
+            if st.button(f"Assign {selected_teacher_display_name or ''} as Head Teacher for {class_to_assign}"):
                 if selected_teacher_id:
                     class_data[class_to_assign]["head_teacher_id"] = selected_teacher_id
                     save_data(class_data, CLASS_DATA_FILE)
@@ -678,6 +949,14 @@ def manage_classes_admin():
         else:
             st.info("Select a class to assign a head teacher.")
 
+def fee_records_by_id(fee_record):
+    """Return fee_record['records'] as {record_id: record}, converting the older list layout in place"""
+    records = fee_record.setdefault("records", {})
+    if isinstance(records, list):
+        records = {r['id']: r for r in records}
+        fee_record["records"] = records
+    return records
+
 def manage_fee_admin():
     """Admin view for managing student fees"""
     st.header("💰 Fee Management")
@@ -685,20 +964,20 @@ def manage_fee_admin():
     fee_data = st.session_state.fee_data
     students = st.session_state.students
 
-    # Flatten the students dictionary for easier searching
-    all_students_list = [s for students_in_class in students.values() for s in students_in_class]
-    student_options = {f"{s['name']} ({s['admission_no']})": s['id'] for s in all_students_list}
-    student_display_names = [""] + sorted(list(student_options.keys()))
+    # Flattened once per students version and shared by both tabs
+    student_options, student_display_names, students_by_id = build_student_options(get_data_version('students'), students)
 
     tab1, tab2 = st.tabs(["Record Fee Payment", "View/Edit Fee Records"])
 
     with tab1:
         st.subheader("Record New Payment")
+        # Outside the form so typing filters the picker immediately
+        record_fee_search = st.text_input("Search Student (name or admission number)", key="record_fee_student_search")
         with st.form("record_fee_payment_form", clear_on_submit=True):
-            selected_student_display_name = st.selectbox("Select Student", student_display_names, key="record_fee_student_select")
+            selected_student_display_name = st.selectbox("Select Student", filter_picker_options(student_display_names, record_fee_search), index=None, placeholder="Select...", key="record_fee_student_select")
             if selected_student_display_name:
                 selected_student_id = student_options[selected_student_display_name]
-                selected_student_info = next((s for s in all_students_list if s['id'] == selected_student_id), None)
+                selected_student_info = students_by_id.get(selected_student_id)
                 if selected_student_info:
                     st.info(f"You are recording a payment for {selected_student_info['name']} in {selected_student_info['class']}.")
 
@@ -714,50 +993,51 @@ def manage_fee_admin():
                 elif payment_amount <= 0:
                     st.error("Payment amount must be greater than zero.")
                 else:
-                    fee_record = fee_data.get(selected_student_id, {"records": [], "amount_due": 0.0, "amount_paid": 0.0})
-                    fee_record["records"].append({
-                        "id": str(uuid.uuid4()),
+                    fee_record = fee_data.get(selected_student_id, {"records": {}, "amount_due": 0.0, "amount_paid": 0.0})
+                    record_id = str(uuid.uuid4())
+                    fee_records_by_id(fee_record)[record_id] = {
+                        "id": record_id,
                         "type": fee_type,
                         "amount": payment_amount,
                         "method": payment_method,
                         "date": str(payment_date),
                         "description": description
-                    })
+                    }
                     fee_record["amount_paid"] += payment_amount
                     # For simplicity, assume amount due is a fixed value or needs to be set elsewhere.
                     # This example just adds to amount_paid.
                     fee_data[selected_student_id] = fee_record
                     save_data(fee_data, FEE_DATA_FILE)
-                    st.success(f"Payment of ₹{payment_amount:.2f} recorded for {selected_student_display_name} successfully.")
-                    st.rerun()
+                    bump_data_version('fee_data')
+                    st.success(f"Payment of ₹{payment_amount:.2f} recorded for {selected_student_display_name} successfully.") # The history tab renders after this and already sees the new record
 
     with tab2:
         st.subheader("View/Edit Fee Records")
-        selected_student_display_name_view = st.selectbox("Select Student", student_display_names, key="view_fee_student_select")
+        view_fee_search = st.text_input("Search Student (name or admission number)", key="view_fee_student_search")
+        selected_student_display_name_view = st.selectbox("Select Student", filter_picker_options(student_display_names, view_fee_search), index=None, placeholder="Select...", key="view_fee_student_select")
         if selected_student_display_name_view:
             selected_student_id = student_options[selected_student_display_name_view]
-            fee_record = fee_data.get(selected_student_id, {"records": [], "amount_due": 0.0, "amount_paid": 0.0})
+            fee_record = fee_data.get(selected_student_id, {"records": {}, "amount_due": 0.0, "amount_paid": 0.0})
+            fee_records = fee_records_by_id(fee_record)
 
             st.metric("Total Amount Paid", f"₹{fee_record['amount_paid']:.2f}")
 
-            if fee_record["records"]:
+            if fee_records:
                 st.subheader("Payment History")
-                df_records = pd.DataFrame(fee_record["records"])
-                df_records_display = df_records.drop(columns=['id'], errors='ignore')
+                df_records_display = build_fee_records_frame(get_data_version('fee_data'), selected_student_id, fee_records)
                 st.dataframe(df_records_display, use_container_width=True)
 
                 st.subheader("Delete a Record")
-                record_ids = [r['id'] for r in fee_record['records']]
-                record_to_delete_id = st.selectbox("Select Record to Delete", [""] + record_ids)
+                record_to_delete_id = st.selectbox("Select Record to Delete", list(fee_records), index=None, placeholder="Select...")
 
                 if st.button("Delete Selected Record", key="delete_fee_record_btn"):
                     if record_to_delete_id:
-                        record_to_delete = next((r for r in fee_record['records'] if r['id'] == record_to_delete_id), None)
+                        record_to_delete = fee_records.pop(record_to_delete_id, None)
                         if record_to_delete:
-                            fee_record['records'] = [r for r in fee_record['records'] if r['id'] != record_to_delete_id]
                             fee_record['amount_paid'] -= record_to_delete['amount']
                             fee_data[selected_student_id] = fee_record
                             save_data(fee_data, FEE_DATA_FILE)
+                            bump_data_version('fee_data')
                             st.success("Fee record deleted successfully.")
                             st.rerun()
                         else:
@@ -781,12 +1061,12 @@ def manage_events_notices_admin():
         st.subheader("Add New Event or Notice")
         with st.form("add_event_form", clear_on_submit=True):
             event_type = st.radio("Select Type", ["Event", "Notice"])
-            title = st.text_input("Title*").strip()
+            title = stripped_text_input("Title*")
             description = st.text_area("Description*").strip()
             if event_type == "Event":
                 event_date = st.date_input("Event Date*", min_value=datetime.today().date())
                 event_time = st.time_input("Event Time*", value=datetime.now().time())
-                venue = st.text_input("Venue (Optional)").strip()
+                venue = stripped_text_input("Venue (Optional)")
             else:
                 event_date = None
                 event_time = None
@@ -808,8 +1088,8 @@ def manage_events_notices_admin():
                         "venue": venue
                     }
                     save_data(event_notice_data, EVENT_NOTICE_DATA_FILE)
-                    st.success(f"{event_type} '{title}' added successfully!")
-                    st.rerun()
+                    bump_data_version('event_notice_data')
+                    st.success(f"{event_type} '{title}' added successfully!") # The manage tab renders after this and already sees the new entry
 
     with tab2:
         st.subheader("Manage Existing Events/Notices")
@@ -818,21 +1098,22 @@ def manage_events_notices_admin():
             st.info("No events or notices available.")
             return
 
-        df_events_notices = pd.DataFrame(events_notices_list)
-        df_events_notices_display = df_events_notices.drop(columns=['id'], errors='ignore')
+        df_events_notices_display = build_events_frame(get_data_version('event_notice_data'), event_notice_data)
         st.dataframe(df_events_notices_display, use_container_width=True)
 
         st.subheader("Delete Event/Notice")
-        event_notice_titles = [f"{e['title']} ({e['date_posted']})" for e in events_notices_list]
-        selected_title = st.selectbox("Select Event/Notice to Delete", [""] + sorted(event_notice_titles), key="delete_event_notice_select")
+        event_ids_by_title = build_event_title_options(get_data_version('event_notice_data'), event_notice_data)
+        delete_event_search = st.text_input("Search Events/Notices", key="delete_event_notice_search")
+        selected_title = st.selectbox("Select Event/Notice to Delete", filter_picker_options(event_ids_by_title, delete_event_search), index=None, placeholder="Select...", key="delete_event_notice_select")
 
         if selected_title:
-            selected_event_notice_obj = next((e for e in events_notices_list if f"{e['title']} ({e['date_posted']})" == selected_title), None)
+            selected_event_notice_obj = event_notice_data.get(event_ids_by_title.get(selected_title))
             if selected_event_notice_obj:
                 st.warning(f"Are you sure you want to delete '{selected_event_notice_obj['title']}'?")
                 if st.button("Confirm Delete", key=f"confirm_delete_event_{selected_event_notice_obj['id']}"):
                     del event_notice_data[selected_event_notice_obj['id']]
                     save_data(event_notice_data, EVENT_NOTICE_DATA_FILE)
+                    bump_data_version('event_notice_data')
                     st.success("Event/Notice deleted successfully.")
                     st.rerun()
 
@@ -847,11 +1128,10 @@ def view_dashboard_teacher_student():
     event_notice_data = st.session_state.event_notice_data
     if event_notice_data:
         st.subheader("📢 Latest School Notices & Events")
-        sorted_notices = sorted(
-            event_notice_data.values(),
-            key=lambda x: datetime.strptime(x.get('date_posted', '1900-01-01'), '%Y-%m-%d'),
-            reverse=True
-        )
+        notices = list(event_notice_data.values())
+        # Parse all posting dates in one vectorized call, then order the notices newest first
+        posted_dates = pd.to_datetime(pd.Series([n.get('date_posted', '1900-01-01') for n in notices]), format='%Y-%m-%d', cache=True)
+        sorted_notices = [notices[i] for i in posted_dates.sort_values(ascending=False, kind='stable').index]
         for notice in sorted_notices:
             with st.expander(f"**{notice['title']}** - ({notice['type']})"):
                 st.write(f"**Date Posted:** {notice.get('date_posted')}")
@@ -1,38 +1,231 @@
 import streamlit as st
 import pandas as pd
 import json
+import copy
 import os
 import calendar
 from datetime import datetime, timedelta
+from operator import itemgetter
 import uuid
 from streamlit_option_menu import option_menu
 import hashlib
+import hmac
+import sqlite3
+from contextlib import closing
+import queue
+import heapq
+import shutil
+import threading
+import atexit
+import tempfile
+import contextlib
+import logging
+try:
+    import orjson # Optional faster JSON parser/serializer; stdlib json is used when it is missing
+except ImportError:
+    orjson = None
 
 # ======================
 # DATA MANAGEMENT (Consistent with other modules)
 # ======================
 
+# Each save leaves the previous mtime's entry behind; cap the cache so stale parses are evicted
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_json_cached(filename, mtime_ns, size):
+    """Parse a JSON file once per modification time; st.cache_data hands each caller its own copy"""
+    with open(filename, 'rb') as f: # Both parsers take bytes directly, skipping a text decode pass
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
 def load_data(filename):
     """Load data from JSON file"""
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                st.error(f"Error decoding JSON from {filename}. File might be corrupted or empty. Returning empty dict.")
-                return {}
-    return {}
+    dirty_files = st.session_state.get('_dirty_files', {})
+    if filename in dirty_files:
+        # Saved earlier in this rerun but not flushed yet; hand out a copy like the cached path does
+        return copy.deepcopy(dirty_files[filename])
+    with _queued_writes_lock:
+        discarded = _discard_failed_write(filename)
+        if discarded:
+            _failed_writes.pop(filename, None) # Reported here instead
+        if filename in _queued_writes:
+            # Handed to the background writer but not on disk yet; the file would be stale
+            return copy.deepcopy(_queued_writes[filename])
+    if discarded:
+        st.error(f"Could not save {os.path.basename(filename)}: {discarded}. Your changes were discarded and the current data reloaded.")
+    try:
+        # Keyed on mtime so any save (from this or another module) invalidates the cached parse; size also catches
+        # rewrites that land within the filesystem's mtime granularity
+        stat = os.stat(filename)
+        return _load_json_cached(filename, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        st.error(f"Error decoding JSON from {filename}. File might be corrupted or empty. Returning empty dict.")
+        return {}
+
+# Teacher and timetable data are only read here, so every session can share one parsed object per file
+# version instead of paying cache_data's pickle/copy on each read
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_json_shared(filename, mtime_ns, size):
+    """Parse a JSON file once per modification time into a single object shared across sessions; do not mutate it"""
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def load_reference_data(filename):
+    """Read-only load for reference files (teachers, timetable) that the parent portal never writes"""
+    try:
+        stat = os.stat(filename)
+        return _load_json_shared(filename, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        st.error(f"Error decoding JSON from {filename}. File might be corrupted or empty. Returning empty dict.")
+        return {}
+
+def deferred_file_bytes(path):
+    """Callable for st.download_button(data=...) so the file is only read when the button is clicked, not on every rerun"""
+    def read_file_bytes():
+        with open(path, "rb") as f:
+            return f.read()
+    return read_file_bytes
+
+def file_version(filename):
+    """(mtime_ns, size) of a data file, to key cached views derived from it and tell whether it changed ((0, 0) if the file is missing)"""
+    try:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return 0, 0
 
 def save_data(data, filename):
-    """Save data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Mark data for saving; the write happens once per rerun in flush_dirty_files()"""
+    st.session_state.setdefault('_dirty_files', {})[filename] = data
+
+logger = logging.getLogger(__name__)
+
+# Background writer: flush_dirty_files() queues (filename, data) and returns; a single daemon thread writes
+# them to disk in order. _queued_writes holds the newest queued data per file until it lands, for load_data.
+# A failed write keeps its data in _queued_writes and records the error in _failed_writes, so the next
+# rerun can report it and queue the data again (retry_failed_writes). _queued_bases records the file version
+# the data was based on: once the file changes on disk, or after MAX_SAVE_ATTEMPTS failures, the failed data
+# is dropped rather than written over other sessions' saves.
+MAX_SAVE_ATTEMPTS = 3
+write_queue = queue.Queue()
+_queued_writes = {}
+_queued_bases = {}
+_write_failures = {}
+_failed_writes = {}
+_queued_writes_lock = threading.Lock()
+
+def _forget_queued_write(filename):
+    _queued_writes.pop(filename, None)
+    _queued_bases.pop(filename, None)
+    _write_failures.pop(filename, None)
+
+def _discard_failed_write(filename):
+    """Drop queued data whose save failed if the file changed since it was queued or it is out of attempts;
+    returns the reason, or None if it is kept. Call with _queued_writes_lock held."""
+    if filename not in _write_failures:
+        return None # Not failed (or not queued): a pending save simply lands as the newest write
+    if file_version(filename) != _queued_bases.get(filename):
+        reason = "the file was changed by someone else in the meantime"
+    elif _write_failures[filename] >= MAX_SAVE_ATTEMPTS:
+        reason = f"gave up after {MAX_SAVE_ATTEMPTS} attempts"
+    else:
+        return None
+    _forget_queued_write(filename)
+    return reason
+
+def _write_json(data, filename):
+    # Compact JSON written to a temp file and swapped in, so other dashboards never read a half-written file.
+    # The temp file is unique per call: the other dashboards' sessions and writers are threads of this same process.
+    if orjson is not None:
+        content = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) # Non-str keys are stringified like json.dump does
+    else:
+        content = json.dumps(data, separators=(',', ':')).encode() # Encode once, one write; json.dump issues a write per chunk
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_filename, filename)
+    finally:
+        with contextlib.suppress(FileNotFoundError): # Already renamed into place unless the write failed
+            os.remove(tmp_filename)
+
+def _write_queue_worker():
+    while True:
+        filename, data = write_queue.get()
+        try:
+            with _queued_writes_lock:
+                if _queued_writes.get(filename) is data and filename in _write_failures:
+                    # A retry: re-check right before writing so it never lands over a newer save from elsewhere
+                    discarded = _discard_failed_write(filename)
+                    if discarded:
+                        _failed_writes[filename] = discarded
+                        continue
+            _write_json(data, filename)
+        except Exception as e: # Keep the writer alive; there is no UI to report to from this thread
+            logger.exception("Saving %s failed", filename)
+            with _queued_writes_lock:
+                if _queued_writes.get(filename) is data: # Otherwise a newer save of the same file is already queued
+                    _write_failures[filename] = _write_failures.get(filename, 0) + 1
+                    _failed_writes[filename] = str(e)
+        else:
+            with _queued_writes_lock:
+                if _queued_writes.get(filename) is data: # A newer save of the same file is still queued otherwise
+                    _forget_queued_write(filename)
+                    _failed_writes.pop(filename, None)
+                elif filename in _queued_bases:
+                    _queued_bases[filename] = file_version(filename) # The newer save builds on what was just written
+        finally:
+            write_queue.task_done()
+
+threading.Thread(target=_write_queue_worker, name="parent-portal-writer", daemon=True).start()
+atexit.register(write_queue.join) # Don't drop queued saves on shutdown
+
+def retry_failed_writes():
+    """Show an error for each background save that failed since the last rerun and queue its data again,
+    unless the file has changed since or the save is out of attempts"""
+    with _queued_writes_lock:
+        failed = []
+        retries = []
+        for filename, error in _failed_writes.items():
+            discarded = _discard_failed_write(filename)
+            if filename in _write_failures:
+                retries.append((filename, _queued_writes[filename]))
+                failed.append((filename, f"{error}. Your changes are kept and will be saved again (attempt {_write_failures[filename] + 1} of {MAX_SAVE_ATTEMPTS})"))
+            elif filename in _queued_writes:
+                failed.append((filename, f"{error}. A newer save of this file is already queued")) # Flushed since the failure; not re-queued
+            else:
+                failed.append((filename, f"{discarded or error}. Your changes were discarded and the current data reloaded"))
+        _failed_writes.clear()
+    for filename, message in failed:
+        st.error(f"Could not save {os.path.basename(filename)}: {message}.")
+    for filename, data in retries:
+        write_queue.put((filename, data))
+
+def flush_dirty_files():
+    """Hand every file saved during this rerun to the background writer, once each"""
+    dirty_files = st.session_state.get('_dirty_files', {})
+    while dirty_files:
+        filename, data = dirty_files.popitem()
+        with _queued_writes_lock:
+            _queued_writes[filename] = data
+            _queued_bases[filename] = file_version(filename)
+            _write_failures.pop(filename, None)
+        write_queue.put((filename, data))
 
 # Initialize data files paths
 DATA_DIR = "data"
-os.makedirs(DATA_DIR, exist_ok=True) # Ensure data directory exists
-os.makedirs(os.path.join(DATA_DIR, "attachments"), exist_ok=True) # Ensure attachments directory exists
-os.makedirs(os.path.join(DATA_DIR, "submissions"), exist_ok=True) # Ensure submissions directory exists
+# Data directory and sub-directories, created by ensure_data_dirs()
+DATA_DIRS = (DATA_DIR, os.path.join(DATA_DIR, "attachments"), os.path.join(DATA_DIR, "submissions"), os.path.join(DATA_DIR, "leave_attachments"))
+
+@st.cache_resource(show_spinner=False)
+def ensure_data_dirs():
+    """Create the data directories once per process instead of on every script run"""
+    for directory in DATA_DIRS:
+        os.makedirs(directory, exist_ok=True)
 
 TEACHER_DATA_FILE = os.path.join(DATA_DIR, "teacher_data.json")
 STUDENT_DATA_FILE = os.path.join(DATA_DIR, "student_data.json")
@@ -46,38 +239,76 @@ TIMETABLE_DATA_FILE = os.path.join(DATA_DIR, "timetable_data.json")
 MESSAGES_DATA_FILE = os.path.join(DATA_DIR, "messages_data.json")
 RESOURCES_DATA_FILE = os.path.join(DATA_DIR, "resources_data.json")
 LEAVE_DATA_FILE = os.path.join(DATA_DIR, "leave_data.json")
+STUDENT_LEAVE_DB = os.path.join(DATA_DIR, "student_leaves.sqlite") # Student leave applications; teacher leaves stay in JSON
 
 
 # Grade levels and sections
 GRADE_LEVELS = ["Nursery", "LKG", "UKG"] + [f"Grade {i}" for i in range(1, 11)]
 CLASS_SECTIONS = ["A", "B", "C", "D"]
+PRIMARY_GRADES = frozenset({"Nursery", "LKG", "UKG"}) # Grades without sections
+PARENT_AUDIENCES = frozenset({"All", "Parents"}) # Notice audiences every parent sees, besides their child's class
+# Stored leave field -> leave history column, in display order
+LEAVE_HISTORY_COLUMNS = {"id": "Leave ID", "type": "Type", "start_date": "Start Date", "end_date": "End Date", "leave_days": "Days", "reason": "Reason", "status": "Status", "application_date": "Applied On"}
+
+# Every class with sections, computed once at import since it depends only on the constants above
+FULL_CLASS_LIST = tuple(
+    grade if grade in PRIMARY_GRADES else f"{grade}{section}"
+    for grade in GRADE_LEVELS
+    for section in (("",) if grade in PRIMARY_GRADES else CLASS_SECTIONS)
+)
 
 def get_full_class_list():
-    """Generate complete list of classes with sections"""
-    classes = []
-    for grade in GRADE_LEVELS:
-        if grade in ["Nursery", "LKG", "UKG"]:
-            classes.append(grade)
-        else:
-            for section in CLASS_SECTIONS:
-                classes.append(f"{grade}{section}")
-    return classes
+    """Return the complete list of classes with sections"""
+    return FULL_CLASS_LIST
 
 # ======================
 # SECURITY & AUTHENTICATION (Parent Specific)
 # ======================
 
-def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password, salt=None):
+    """Hash password with scrypt and a per-password salt; stored as 'scrypt$<salt hex>$<hash hex>'"""
+    salt = os.urandom(16) if salt is None else salt
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32)
+    return f"scrypt${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored_hash):
+    """Check a password against a stored hash (only runs on login submit, so it is not cached: a shared cache would key on the plaintext)"""
+    if stored_hash.startswith("scrypt$"):
+        _, salt_hex, _ = stored_hash.split("$")
+        return hmac.compare_digest(hash_password(password, bytes.fromhex(salt_hex)), stored_hash)
+    # Accounts registered before scrypt hashing store a bare SHA-256 hex digest
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _build_admission_index(version):
+    """Map admission_no -> (class_name, index) for the student file at version (mtime_ns, size)"""
+    return {
+        student['admission_no']: (class_name, i)
+        for class_name, students in load_data(STUDENT_DATA_FILE).items()
+        for i, student in enumerate(students)
+        if 'admission_no' in student
+    }
+
+def find_student_location(student_data, admission_no):
+    """Return (class_name, index) of the student with the given admission number in student_data, or None"""
+    location = _build_admission_index(file_version(STUDENT_DATA_FILE)).get(admission_no)
+    if location:
+        class_name, i = location
+        students = student_data.get(class_name, [])
+        # Guard against the file changing between the index build and the caller's load
+        if i < len(students) and students[i].get('admission_no') == admission_no:
+            return location
+    return None
 
 def authenticate_parent(admission_no, password):
     """Authenticate parent credentials using student admission number and parent password"""
     student_data = load_data(STUDENT_DATA_FILE)
-    for class_name, students in student_data.items():
-        for student in students:
-            if student.get('admission_no') == admission_no and student.get('parent_password') == hash_password(password):
-                return student # Return the student object if authenticated
+    location = find_student_location(student_data, admission_no)
+    if location:
+        class_name, i = location
+        student = student_data[class_name][i]
+        if student.get('parent_password') and verify_password(password, student['parent_password']):
+            return student # Return the student object if authenticated
     return None
 
 def register_parent_page():
@@ -100,30 +331,25 @@ def register_parent_page():
                 st.error("Passwords do not match.")
             else:
                 student_data = load_data(STUDENT_DATA_FILE)
-                student_found = False
-                for class_name, students in student_data.items():
-                    for i, student in enumerate(students):
-                        if student.get('admission_no') == student_admission_no:
-                            # Check if parent account already exists for this student admission number
-                            if student.get('parent_password'):
-                                st.error(f"A parent account already exists for Student Admission Number {student_admission_no}. Please login or contact school administration.")
-                                return
-
-                            # Update student record with parent info and hashed password
-                            student_data[class_name][i]['parent_name'] = parent_name
-                            student_data[class_name][i]['parent_email'] = parent_email
-                            student_data[class_name][i]['parent_phone'] = parent_phone
-                            student_data[class_name][i]['parent_password'] = hash_password(new_password)
-                            save_data(student_data, STUDENT_DATA_FILE)
-                            st.success(f"Parent account for Student Admission Number {student_admission_no} registered successfully! You can now login.")
-                            st.session_state['show_parent_login'] = True # After registration, show login
-                            student_found = True
-                            st.rerun()
-                            break
-                    if student_found:
-                        break
-                
-                if not student_found:
+                location = find_student_location(student_data, student_admission_no)
+                if location:
+                    class_name, i = location
+                    student = student_data[class_name][i]
+                    # Check if parent account already exists for this student admission number
+                    if student.get('parent_password'):
+                        st.error(f"A parent account already exists for Student Admission Number {student_admission_no}. Please login or contact school administration.")
+                        return
+
+                    # Update student record with parent info and hashed password
+                    student['parent_name'] = parent_name
+                    student['parent_email'] = parent_email
+                    student['parent_phone'] = parent_phone
+                    student['parent_password'] = hash_password(new_password)
+                    save_data(student_data, STUDENT_DATA_FILE)
+                    st.success(f"Parent account for Student Admission Number {student_admission_no} registered successfully! You can now login.")
+                    st.session_state['show_parent_login'] = True # After registration, show login
+                    st.rerun()
+                else:
                     st.error(f"Student Admission Number {student_admission_no} not found. Please ensure you enter the correct number.")
 
 
@@ -165,6 +391,74 @@ def parent_login_or_register_page():
 # PARENT MODULE FUNCTIONS
 # ======================
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_attendance_index(version):
+    """Map (class_name, student_id) -> [(date, status), ...] in date order, from the attendance file at version (mtime_ns, size)"""
+    index = {}
+    for teacher_attn in load_data(ATTENDANCE_DATA_FILE).values():
+        for date_str, class_attn in teacher_attn.items():
+            for class_name, statuses in class_attn.items():
+                for student_id, status in statuses.items():
+                    index.setdefault((class_name, student_id), []).append((date_str, status))
+    for records in index.values():
+        records.sort()
+    return index
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_performance_index(version):
+    """Map (class_name, student_id) -> the student's performance record, from the performance file at version (mtime_ns, size)"""
+    index = {}
+    for classes_perf in load_data(PERFORMANCE_DATA_FILE).values():
+        for class_name, records in classes_perf.items():
+            for record in records:
+                index.setdefault((class_name, record['student_id']), record) # First match wins, as with the old scan
+    return index
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_parent_sent_index(version):
+    """Map sender_id -> messages sent by that parent, from the messages file at version (mtime_ns, size)"""
+    index = {}
+    for messages_list in load_data(MESSAGES_DATA_FILE).values():
+        for msg in messages_list:
+            if msg.get('sender_type') == 'parent':
+                index.setdefault(msg.get('sender_id'), []).append(msg)
+    return index
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def subjects_for_class(version, class_name):
+    """Subjects timetabled for class_name in the timetable file at version (mtime_ns, size)"""
+    return frozenset(entry['subject'] for entries in load_reference_data(TIMETABLE_DATA_FILE).values() for entry in entries if entry['class_name'] == class_name)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_resource_index(version):
+    """(resources, by_class, by_tag) from the resources file at version (mtime_ns, size): resources is a list of (teacher_id, resource)
+    newest upload first, and by_class/by_tag map a class name or tag to positions in that list.
+    Shared across sessions without copying (st.cache_resource); callers must not mutate it."""
+    resources = [(teacher_id, resource) for teacher_id, teacher_resources in load_reference_data(RESOURCES_DATA_FILE).items() for resource in teacher_resources]
+    resources.sort(key=lambda item: item[1]['upload_date'], reverse=True) # Sorted once per file change, so positions are display order
+    by_class, by_tag = {}, {}
+    for position, (teacher_id, resource) in enumerate(resources):
+        by_class.setdefault(resource['class_name'], []).append(position)
+        for tag in resource.get('tags', []):
+            by_tag.setdefault(tag, []).append(position)
+    return resources, by_class, by_tag
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def relevant_notices(version, student_class):
+    """Notices/events addressed to all, to parents, or to student_class, from the events file at version (mtime_ns, size).
+    Each entry carries '_published' (publish_date, or the admin module's date_posted) and '_sort_dt', its event
+    (else published) date parsed once here rather than per sort/compare; undated entries get date.min and sort last."""
+    audience_keys = PARENT_AUDIENCES | {student_class}
+    relevant = []
+    for entry in load_data(EVENT_NOTICE_DATA_FILE).values():
+        if not audience_keys.isdisjoint(entry.get('target_audience', ['All'])):
+            # The admin module writes notices with event_date None and only a date_posted key
+            entry['_published'] = entry.get('publish_date') or entry.get('date_posted') # None if undated
+            sort_date = entry.get('event_date') or entry.get('publish_date') or entry.get('date_posted')
+            entry['_sort_dt'] = datetime.strptime(sort_date, '%Y-%m-%d').date() if sort_date else datetime.min.date()
+            relevant.append(entry)
+    return relevant
+
 def display_parent_dashboard(student_info):
     """Display parent dashboard overview"""
     st.header(f"👋 Welcome, {student_info.get('parent_name', 'Parent')}!")
@@ -181,52 +475,30 @@ def display_parent_dashboard(student_info):
     st.subheader("Quick Overview")
 
     # Latest Attendance
-    attendance_data = load_data(ATTENDANCE_DATA_FILE)
-    latest_attendance = "N/A"
-    if attendance_data:
-        for teacher_attn in attendance_data.values():
-            for date_str, class_attn in teacher_attn.items():
-                if student_info['class'] in class_attn:
-                    # Use student's internal ID for attendance lookup
-                    if str(student_info['id']) in class_attn[student_info['class']]:
-                        latest_attendance = f"{date_str}: {class_attn[student_info['class']][str(student_info['id'])]}"
-                        break # Found latest for this student
-            if latest_attendance != "N/A":
-                break
+    # Use student's internal ID for attendance lookup; records are in date order so the last one is the latest
+    attendance_records = build_attendance_index(file_version(ATTENDANCE_DATA_FILE)).get((student_info['class'], str(student_info['id'])))
+    latest_attendance = f"{attendance_records[-1][0]}: {attendance_records[-1][1]}" if attendance_records else "N/A"
     st.info(f"**Latest Attendance:** {latest_attendance}")
 
     # Latest Academic Performance
-    performance_data = load_data(PERFORMANCE_DATA_FILE)
-    latest_performance = "N/A"
-    if performance_data:
-        for teacher_perf in performance_data.values():
-            if student_info['class'] in teacher_perf:
-                for student_perf_record in teacher_perf[student_info['class']]:
-                    # Use student's internal ID for performance lookup
-                    if student_perf_record['student_id'] == student_info['id']:
-                        latest_performance = f"Overall Average: {student_perf_record['average']:.2f}%"
-                        break
-            if latest_performance != "N/A":
-                break
+    # Use student's internal ID for performance lookup
+    student_perf_record = build_performance_index(file_version(PERFORMANCE_DATA_FILE)).get((student_info['class'], student_info['id']))
+    latest_performance = f"Overall Average: {student_perf_record['average']:.2f}%" if student_perf_record else "N/A"
     st.info(f"**Academic Performance:** {latest_performance}")
 
     # Upcoming Events/Notices
-    event_notice_data = load_data(EVENT_NOTICE_DATA_FILE)
+    event_notice_version = file_version(EVENT_NOTICE_DATA_FILE)
     upcoming_events = []
     today = datetime.today().date()
-    if event_notice_data:
-        for entry_id, entry in event_notice_data.items():
+    if event_notice_version != (0, 0): # (0, 0): no events file yet
+        for entry in relevant_notices(event_notice_version, student_info['class']):
             if entry['type'] == "Event" and entry['event_date']:
-                event_date = datetime.strptime(entry['event_date'], '%Y-%m-%d').date()
-                if event_date >= today:
-                    # Check target audience
-                    target_audience = entry.get('target_audience', ['All'])
-                    if "All" in target_audience or "Parents" in target_audience or student_info['class'] in target_audience:
-                        upcoming_events.append(f"{entry['event_date']} - {entry['title']}")
-        
+                if entry['_sort_dt'] >= today: # _sort_dt is the parsed event_date here
+                    upcoming_events.append(f"{entry['event_date']} - {entry['title']}")
+
         if upcoming_events:
             st.subheader("Upcoming Events")
-            for event in sorted(upcoming_events):
+            for event in heapq.nsmallest(10, upcoming_events): # Soonest 10; entries start with the ISO date
                 st.write(f"- {event}")
         else:
             st.info("No upcoming events.")
@@ -236,41 +508,19 @@ def view_attendance_performance(student_info):
     st.header(f"📈 {student_info['name']}'s Progress Report")
 
     st.subheader("Attendance Records")
-    attendance_data = load_data(ATTENDANCE_DATA_FILE)
-    student_attendance_records = []
-    
-    if attendance_data:
-        for teacher_id, teacher_attn in attendance_data.items():
-            for date_str, class_attn in teacher_attn.items():
-                if student_info['class'] in class_attn:
-                    if str(student_info['id']) in class_attn[student_info['class']]:
-                        student_attendance_records.append({
-                            "Date": date_str,
-                            "Status": class_attn[student_info['class']][str(student_info['id'])]
-                        })
-    
+    student_attendance_records = build_attendance_index(file_version(ATTENDANCE_DATA_FILE)).get((student_info['class'], str(student_info['id'])), [])
+
     if student_attendance_records:
-        df_attendance = pd.DataFrame(student_attendance_records)
-        df_attendance['Date'] = pd.to_datetime(df_attendance['Date'])
-        df_attendance = df_attendance.sort_values(by='Date', ascending=False).reset_index(drop=True)
+        # Index records are already in ascending date order; build newest-first columns directly
+        dates, statuses = zip(*reversed(student_attendance_records))
+        df_attendance = pd.DataFrame({"Date": pd.to_datetime(list(dates)), "Status": list(statuses)})
         st.dataframe(df_attendance, use_container_width=True)
     else:
         st.info("No attendance records found for your child.")
 
     st.subheader("Academic Performance")
-    performance_data = load_data(PERFORMANCE_DATA_FILE)
-    student_performance_record = None
-
-    if performance_data:
-        for teacher_id, classes_perf in performance_data.items():
-            if student_info['class'] in classes_perf:
-                for student_perf in classes_perf[student_info['class']]:
-                    if student_perf['student_id'] == student_info['id']:
-                        student_performance_record = student_perf
-                        break
-            if student_performance_record:
-                break
-    
+    student_performance_record = build_performance_index(file_version(PERFORMANCE_DATA_FILE)).get((student_info['class'], student_info['id']))
+
     if student_performance_record:
         st.write(f"**Overall Average:** {student_performance_record['average']:.2f}%")
         if student_performance_record.get('subjects'):
@@ -291,62 +541,56 @@ def access_notices_events_timetables(student_info):
 
     with tab1:
         st.subheader("Notices & Events")
-        event_notice_data = load_data(EVENT_NOTICE_DATA_FILE)
-        
-        if not event_notice_data:
+        event_notice_version = file_version(EVENT_NOTICE_DATA_FILE)
+
+        if event_notice_version == (0, 0) or not load_data(EVENT_NOTICE_DATA_FILE):
             st.info("No notices or events published yet.")
             return
 
-        all_entries = list(event_notice_data.values())
-        
-        # Filter for relevant entries: "All", "Parents", or child's class
-        relevant_entries = []
-        for entry in all_entries:
-            target_audience = entry.get('target_audience', ['All'])
-            if "All" in target_audience or "Parents" in target_audience or student_info['class'] in target_audience:
-                relevant_entries.append(entry)
+        # Relevant entries: "All", "Parents", or child's class
+        relevant_entries = relevant_notices(event_notice_version, student_info['class'])
 
         if not relevant_entries:
             st.info("No notices or events relevant to your child's class or parents.")
             return
 
         # Sort by date
-        relevant_entries.sort(key=lambda x: datetime.strptime(x.get('event_date', x['publish_date']), '%Y-%m-%d'), reverse=True)
+        relevant_entries.sort(key=itemgetter('_sort_dt'), reverse=True)
 
         for entry in relevant_entries:
-            with st.expander(f"{entry['type']}: {entry['title']} (Published: {entry['publish_date']})"):
+            with st.expander(f"{entry['type']}: {entry['title']} (Published: {entry['_published'] or 'N/A'})"):
                 st.write(f"**Type:** {entry['type']}")
                 st.write(f"**Title:** {entry['title']}")
-                st.write(f"**Content:** {entry['content']}")
+                st.write(f"**Content:** {entry.get('content') or entry.get('description', '')}") # Admin-posted entries use 'description'
                 if entry['type'] == "Event":
-                    st.write(f"**Event Date:** {entry['event_date']}")
-                    st.write(f"**Event Time:** {entry['event_time']}")
-                    st.write(f"**Location:** {entry['location']}")
-                st.write(f"**Target Audience:** {', '.join(entry['target_audience'])}")
+                    st.write(f"**Event Date:** {entry.get('event_date')}")
+                    st.write(f"**Event Time:** {entry.get('event_time')}")
+                    st.write(f"**Location:** {entry.get('location') or entry.get('venue')}")
+                st.write(f"**Target Audience:** {', '.join(entry.get('target_audience', ['All']))}")
                 
-                if entry['attachment']:
+                if entry.get('attachment'):
                     attachment_path = entry['attachment']['path']
                     if os.path.exists(attachment_path):
-                        with open(attachment_path, "rb") as file:
-                            st.download_button(
-                                label=f"Download Attachment: {entry['attachment']['name']}",
-                                data=file.read(),
-                                file_name=entry['attachment']['name'],
-                                mime=entry['attachment']['type'],
-                                key=f"parent_download_{entry['id']}"
-                            )
+                        st.download_button(
+                            label=f"Download Attachment: {entry['attachment']['name']}",
+                            data=deferred_file_bytes(attachment_path),
+                            file_name=entry['attachment']['name'],
+                            mime=entry['attachment']['type'],
+                            key=f"parent_download_{entry['id']}"
+                        )
                     else:
                         st.warning(f"Attachment file not found: {entry['attachment']['name']}")
 
 
     with tab2:
         st.subheader(f"{student_info['name']}'s Class Timetable")
-        timetable_data_all_teachers = load_data(TIMETABLE_DATA_FILE)
+        timetable_data_all_teachers = load_reference_data(TIMETABLE_DATA_FILE)
+        teachers = load_reference_data(TEACHER_DATA_FILE) # Loaded once, not per teacher in the loop below
         student_class_timetable = []
 
         if timetable_data_all_teachers:
             for teacher_id, entries in timetable_data_all_teachers.items():
-                teacher_name = load_data(TEACHER_DATA_FILE).get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
+                teacher_name = teachers.get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
                 for entry in entries:
                     if entry['class_name'] == student_info['class']:
                         student_class_timetable.append({
@@ -357,11 +601,11 @@ def access_notices_events_timetables(student_info):
                         })
         
         if student_class_timetable:
-            df_timetable = pd.DataFrame(student_class_timetable)
-            # Order by Day and Period for better display
+            # Order by Day and Period for better display; sorted before building the frame so pandas never re-sorts/copies it
             day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-            df_timetable['Day'] = pd.Categorical(df_timetable['Day'], categories=day_order, ordered=True)
-            df_timetable = df_timetable.sort_values(by=['Day', 'Period']).reset_index(drop=True)
+            day_index = {day: i for i, day in enumerate(day_order)}
+            student_class_timetable.sort(key=lambda e: (day_index.get(e['Day'], len(day_order)), e['Period'])) # Unknown days last
+            df_timetable = pd.DataFrame(student_class_timetable)
             st.dataframe(df_timetable, use_container_width=True)
         else:
             st.info("No timetable entries found for your child's class yet.")
@@ -404,8 +648,8 @@ def manage_fee_payment(student_info):
                 student_fee_record['amount_paid'] += payment_amount
                 student_fee_record['last_payment_date'] = str(payment_date)
                 
-                # Generate a simple receipt number (UUID for uniqueness)
-                receipt_number = f"REC-{str(uuid.uuid4().int)[:6]}"
+                # Receipt number: the child's admission number plus a per-child sequence; unique as payment_history only grows
+                receipt_number = f"REC-{student_info.get('admission_no', student_info['id'])}-{len(student_fee_record['payment_history']) + 1:04d}"
                 
                 student_fee_record['payment_history'].append({
                     "date": str(payment_date),
@@ -436,7 +680,7 @@ def messaging_system(student_info):
 
     with tab1:
         st.subheader("Compose New Message")
-        teachers = load_data(TEACHER_DATA_FILE)
+        teachers = load_reference_data(TEACHER_DATA_FILE)
         teacher_options = {t['name']: t['id'] for t in teachers.values() if not t.get('is_admin', False)} # Exclude admins from direct teacher list
         
         # Add an "Admin" option
@@ -496,24 +740,20 @@ def messaging_system(student_info):
 
     with tab2:
         st.subheader("Your Message History")
-        messages_data = load_data(MESSAGES_DATA_FILE)
+        # Resolve recipient names once instead of re-reading the teacher file for every message row
+        recipient_names = {tid: info.get('name', 'Admin/Unknown') for tid, info in load_reference_data(TEACHER_DATA_FILE).items()}
+        # Accumulate columns directly rather than one dict per message row
+        parent_sent_messages = {"Date": [], "Time": [], "Recipient": [], "Subject": [], "Content": [], "Status": []}
+        # Messages this parent sent (keyed by their student's internal ID), without scanning every mailbox
+        for msg in build_parent_sent_index(file_version(MESSAGES_DATA_FILE)).get(student_info['id'], []):
+            parent_sent_messages["Date"].append(msg['date'])
+            parent_sent_messages["Time"].append(msg['time'])
+            parent_sent_messages["Recipient"].append(recipient_names.get(msg['recipient_id'], 'Admin/Unknown'))
+            parent_sent_messages["Subject"].append(msg['subject'])
+            parent_sent_messages["Content"].append(msg['content'])
+            parent_sent_messages["Status"].append(msg['status'])
         
-        parent_sent_messages = []
-        for recipient_id, messages_list in messages_data.items():
-            for msg in messages_list:
-                # Check if the message was sent by this parent (via their student's internal ID)
-                if msg.get('sender_type') == 'parent' and msg.get('sender_id') == student_info['id']:
-                    recipient_name = load_data(TEACHER_DATA_FILE).get(msg['recipient_id'], {}).get('name', 'Admin/Unknown')
-                    parent_sent_messages.append({
-                        "Date": msg['date'],
-                        "Time": msg['time'],
-                        "Recipient": recipient_name,
-                        "Subject": msg['subject'],
-                        "Content": msg['content'],
-                        "Status": msg['status']
-                    })
-        
-        if parent_sent_messages:
+        if parent_sent_messages["Date"]:
             df_messages = pd.DataFrame(parent_sent_messages)
             df_messages['Date'] = pd.to_datetime(df_messages['Date'])
             df_messages = df_messages.sort_values(by=['Date', 'Time'], ascending=False).reset_index(drop=True)
@@ -527,18 +767,15 @@ def messaging_system(student_info):
         # or if the message is broadly targeted at the student's class or parents.
         
         received_messages = []
-        all_event_notices = load_data(EVENT_NOTICE_DATA_FILE)
-        for entry_id, entry in all_event_notices.items():
-            target_audience = entry.get('target_audience', ['All'])
-            if "All" in target_audience or "Parents" in target_audience or student_info['class'] in target_audience:
-                received_messages.append({
-                    "Date": entry['publish_date'],
-                    "Time": "N/A",
-                    "Sender": "School/Admin",
-                    "Subject": f"[{entry['type']}] {entry['title']}",
-                    "Content": entry['content'],
-                    "Status": "Read" # Assume notices are read
-                })
+        for entry in relevant_notices(file_version(EVENT_NOTICE_DATA_FILE), student_info['class']):
+            received_messages.append({
+                "Date": entry['_published'],
+                "Time": "N/A",
+                "Sender": "School/Admin",
+                "Subject": f"[{entry['type']}] {entry['title']}",
+                "Content": entry.get('content') or entry.get('description', ''),
+                "Status": "Read" # Assume notices are read
+            })
         
         # Also check direct messages from teachers if they are structured to target students/parents
         # (Current messages_data.json structure is teacher-centric, so this part is more complex)
@@ -556,6 +793,7 @@ def messaging_system(student_info):
 def download_assignments_notes(student_info):
     """Download assignments and notes relevant to the child's class"""
     st.header("📚 Assignments & Learning Resources")
+    teachers = load_reference_data(TEACHER_DATA_FILE) # Loaded once and shared by both tabs' per-teacher loops
 
     tab1, tab2 = st.tabs(["Assignments", "Learning Resources"])
 
@@ -563,12 +801,14 @@ def download_assignments_notes(student_info):
         st.subheader("Assignments for Your Child's Class")
         assignments_data = load_data(ASSIGNMENTS_DATA_FILE)
         relevant_assignments = []
+        assignment_locations = {} # assignment id -> (teacher id, index in that teacher's list), for the submit path
 
         if assignments_data:
             for teacher_id, teacher_assignments in assignments_data.items():
-                teacher_name = load_data(TEACHER_DATA_FILE).get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
-                for assignment in teacher_assignments:
+                teacher_name = teachers.get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
+                for assignment_index, assignment in enumerate(teacher_assignments):
                     if assignment['assigned_class'] == student_info['class']:
+                        assignment_locations[assignment['id']] = (teacher_id, assignment_index)
                         # Check if student has already submitted this assignment
                         submitted_status = "Not Submitted"
                         submission_id = None
@@ -609,14 +849,16 @@ def download_assignments_notes(student_info):
                 st.info("No assignments available for submission or revision at this time.")
                 return
 
+            relevant_assignments_by_id = {a['ID']: a for a in relevant_assignments}
+            submittable_titles_by_id = {a['ID']: a['Title'] for a in submittable_assignments}
             selected_assignment_to_submit_id = st.selectbox(
                 "Select Assignment to Submit", 
-                [""] + [a['ID'] for a in submittable_assignments],
-                format_func=lambda x: next((a['Title'] for a in submittable_assignments if a['ID'] == x), "")
+                [""] + list(submittable_titles_by_id),
+                format_func=lambda x: submittable_titles_by_id.get(x, "")
             )
 
             if selected_assignment_to_submit_id:
-                selected_assignment_obj = next((a for a in relevant_assignments if a['ID'] == selected_assignment_to_submit_id), None)
+                selected_assignment_obj = relevant_assignments_by_id.get(selected_assignment_to_submit_id)
                 
                 if selected_assignment_obj:
                     st.write(f"**Submitting for:** {selected_assignment_obj['Title']}")
@@ -637,15 +879,9 @@ def download_assignments_notes(student_info):
                             else:
                                 # Find the actual assignment object in the assignments_data
                                 found_assignment = None
-                                for teacher_id_key, teacher_assignments_list in assignments_data.items():
-                                    for i, assign in enumerate(teacher_assignments_list):
-                                        if assign['id'] == selected_assignment_to_submit_id:
-                                            found_assignment = assign
-                                            teacher_of_assignment_id = teacher_id_key
-                                            assignment_index = i
-                                            break
-                                    if found_assignment:
-                                        break
+                                if selected_assignment_to_submit_id in assignment_locations:
+                                    teacher_of_assignment_id, assignment_index = assignment_locations[selected_assignment_to_submit_id]
+                                    found_assignment = assignments_data[teacher_of_assignment_id][assignment_index]
 
                                 if found_assignment:
                                     submission_file_path = None
@@ -653,8 +889,9 @@ def download_assignments_notes(student_info):
                                         submission_filename = f"{selected_assignment_to_submit_id}_{student_info['id']}_{submission_file.name}"
                                         submission_save_path = os.path.join(DATA_DIR, "submissions", submission_filename)
                                         try:
+                                            submission_file.seek(0)
                                             with open(submission_save_path, "wb") as f:
-                                                f.write(submission_file.getvalue())
+                                                shutil.copyfileobj(submission_file, f, length=1 << 20) # 1 MiB chunks, no full-size bytes copy
                                             submission_file_path = submission_save_path
                                         except Exception as e:
                                             st.error(f"Error saving submission file: {e}")
@@ -705,82 +942,59 @@ def download_assignments_notes(student_info):
 
     with tab2:
         st.subheader("Learning Resources for Your Child's Class")
-        resources_data = load_data(RESOURCES_DATA_FILE)
+        resources, resources_by_class, resources_by_tag = build_resource_index(file_version(RESOURCES_DATA_FILE))
         relevant_resources = []
 
         # Determine subjects for the student's class from timetable data
-        student_subjects = set()
-        timetable_data_all_teachers = load_data(TIMETABLE_DATA_FILE)
-        if timetable_data_all_teachers:
-            for teacher_id, entries in timetable_data_all_teachers.items():
-                for entry in entries:
-                    if entry['class_name'] == student_info['class']:
-                        student_subjects.add(entry['subject'])
-        
-        # Fallback if no subjects found in timetable (e.g., for Nursery/LKG/UKG or empty timetable)
-        if not student_subjects:
-            st.info("Could not determine specific subjects for your child's class from timetable. Displaying all relevant resources.")
-            # If no specific subjects, show all resources assigned to the class or 'All Classes'
-            for teacher_id, teacher_resources in resources_data.items():
-                teacher_name = load_data(TEACHER_DATA_FILE).get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
-                for resource in teacher_resources:
-                    if resource['class_name'] == student_info['class'] or resource['class_name'] == "All Classes":
-                        relevant_resources.append({
-                            "ID": resource['id'],
-                            "Title": resource['title'],
-                            "Description": resource['description'],
-                            "Type": resource['type'],
-                            "Tags": ", ".join(resource.get('tags', [])), # Use .get() defensively
-                            "Uploaded By": teacher_name,
-                            "Upload Date": resource['upload_date'],
-                            "File Name": resource['file_name'],
-                            "file_path": resource.get('file_path') # Use .get() defensively
-                        })
+        student_subjects = subjects_for_class(file_version(TIMETABLE_DATA_FILE), student_info['class'])
+
+        # Resources assigned to the class or 'All Classes', plus any tagged with one of the class's subjects
+        matched_positions = set(resources_by_class.get(student_info['class'], [])) | set(resources_by_class.get("All Classes", []))
+        if student_subjects:
+            for subject in student_subjects:
+                matched_positions.update(resources_by_tag.get(subject, []))
         else:
-            # Filter resources based on class or subject tags
-            for teacher_id, teacher_resources in resources_data.items():
-                teacher_name = load_data(TEACHER_DATA_FILE).get(teacher_id, {}).get('name', f"Teacher {teacher_id}")
-                for resource in teacher_resources:
-                    is_relevant_by_class = (resource['class_name'] == student_info['class'] or resource['class_name'] == "All Classes")
-                    is_relevant_by_subject = any(tag in student_subjects for tag in resource.get('tags', []))
-
-                    if is_relevant_by_class or is_relevant_by_subject:
-                        relevant_resources.append({
-                            "ID": resource['id'],
-                            "Title": resource['title'],
-                            "Description": resource['description'],
-                            "Type": resource['type'],
-                            "Tags": ", ".join(resource.get('tags', [])), # Use .get() defensively
-                            "Uploaded By": teacher_name,
-                            "Upload Date": resource['upload_date'],
-                            "File Name": resource['file_name'],
-                            "file_path": resource.get('file_path') # Use .get() defensively
-                        })
+            # Fallback if no subjects found in timetable (e.g., for Nursery/LKG/UKG or empty timetable)
+            st.info("Could not determine specific subjects for your child's class from timetable. Displaying all relevant resources.")
+
+        for position in sorted(matched_positions): # Index positions are already newest-upload-first
+            teacher_id, resource = resources[position]
+            relevant_resources.append({
+                "ID": resource['id'],
+                "Title": resource['title'],
+                "Description": resource['description'],
+                "Type": resource['type'],
+                "Tags": ", ".join(resource.get('tags', [])), # Use .get() defensively
+                "Uploaded By": teachers.get(teacher_id, {}).get('name', f"Teacher {teacher_id}"),
+                "Upload Date": resource['upload_date'],
+                "File Name": resource['file_name'],
+                "file_path": resource.get('file_path') # Use .get() defensively
+            })
 
     if relevant_resources:
-        df_resources = pd.DataFrame(relevant_resources)
-        df_resources['Upload Date'] = pd.to_datetime(df_resources['Upload Date'])
-        df_resources = df_resources.sort_values(by='Upload Date', ascending=False).reset_index(drop=True)
+        # Explicit date format and low-cardinality categories skip per-row dtype inference
+        df_resources = pd.DataFrame(relevant_resources).astype({'Type': 'category', 'Uploaded By': 'category'})
+        df_resources['Upload Date'] = pd.to_datetime(df_resources['Upload Date'], format='%Y-%m-%d', cache=True)
         st.dataframe(df_resources[['Title', 'Description', 'Type', 'Tags', 'Uploaded By', 'Upload Date', 'File Name']], use_container_width=True)
 
         st.markdown("---")
         st.subheader("Download Resource Files")
-        selected_resource_id = st.selectbox("Select Resource to Download", [""] + [r['ID'] for r in relevant_resources],
-                                            format_func=lambda x: next((r['Title'] for r in relevant_resources if r['ID'] == x), ""))
+        relevant_resources_by_id = {r['ID']: r for r in relevant_resources}
+        selected_resource_id = st.selectbox("Select Resource to Download", [""] + list(relevant_resources_by_id),
+                                            format_func=lambda x: relevant_resources_by_id[x]['Title'] if x else "")
 
         if selected_resource_id:
-            resource_to_download = next((r for r in relevant_resources if r['ID'] == selected_resource_id), None)
+            resource_to_download = relevant_resources_by_id.get(selected_resource_id)
             
             if resource_to_download and resource_to_download.get('file_path'):
                 file_path = resource_to_download['file_path']
                 if os.path.exists(file_path):
-                    with open(file_path, "rb") as file:
-                        st.download_button(
-                            label=f"Download {resource_to_download['file_name']}",
-                            data=file.read(),
-                            file_name=resource_to_download['file_name'],
-                            mime=resource_to_download['file_type']
-                        )
+                    st.download_button(
+                        label=f"Download {resource_to_download['file_name']}",
+                        data=deferred_file_bytes(file_path),
+                        file_name=resource_to_download['file_name'],
+                        mime=resource_to_download['file_type']
+                    )
                 else:
                     st.error("File not found. It might have been moved or deleted.")
             else:
@@ -789,6 +1003,63 @@ def download_assignments_notes(student_info):
         st.info("No learning resources found for your child's class or subjects.")
 
 
+# ======================
+# STUDENT LEAVE STORAGE
+# ======================
+
+@st.cache_resource(show_spinner=False)
+def init_student_leave_db():
+    """Create the student leave table (once per process) and import leaves still kept under 'student_leaves' in the JSON leave file"""
+    with closing(sqlite3.connect(STUDENT_LEAVE_DB)) as conn, conn: # closing() closes it; 'with conn' commits/rolls back
+        cursor = conn.cursor()
+        # Indexed columns are the ones queried/updated; the full record is kept as JSON in 'record'
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS student_leaves (
+            id TEXT PRIMARY KEY,
+            target_id TEXT NOT NULL,
+            target_type TEXT NOT NULL,
+            start_date TEXT,
+            end_date TEXT,
+            status TEXT NOT NULL,
+            record TEXT NOT NULL
+        )""")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_student_leaves_target ON student_leaves(target_id, target_type)")
+        # INSERT OR IGNORE: rows already in the table (possibly canceled since) win over the old JSON copy
+        cursor.executemany(
+            "INSERT OR IGNORE INTO student_leaves (id, target_id, target_type, start_date, end_date, status, record) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(leave['id'], leave['target_id'], leave['target_type'], leave['start_date'], leave['end_date'], leave['status'], json.dumps(leave))
+             for leave in load_data(LEAVE_DATA_FILE).get('student_leaves', [])]
+        )
+
+def add_student_leave(leave):
+    """Insert one leave application; writes a single row instead of rewriting every leave"""
+    init_student_leave_db()
+    with closing(sqlite3.connect(STUDENT_LEAVE_DB)) as conn, conn: # closing() closes it; 'with conn' commits/rolls back
+        conn.execute(
+            "INSERT INTO student_leaves (id, target_id, target_type, start_date, end_date, status, record) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (leave['id'], leave['target_id'], leave['target_type'], leave['start_date'], leave['end_date'], leave['status'], json.dumps(leave))
+        )
+
+def get_student_leaves(student_id):
+    """All leave applications for one student, newest first, via the (target_id, target_type) index"""
+    init_student_leave_db()
+    with closing(sqlite3.connect(STUDENT_LEAVE_DB)) as conn, conn: # closing() closes it; 'with conn' commits/rolls back
+        # Rows are inserted as applications arrive, so rowid order is application order; newest first
+        rows = conn.execute("SELECT status, record FROM student_leaves WHERE target_id = ? AND target_type = 'student' ORDER BY rowid DESC", (student_id,)).fetchall()
+    leaves = []
+    for status, record in rows:
+        leave = json.loads(record)
+        leave['status'] = status # The status column is authoritative; cancel only updates it
+        leaves.append(leave)
+    return leaves
+
+def cancel_student_leave(leave_id):
+    """Mark a pending leave as canceled; returns False if it was not pending"""
+    init_student_leave_db()
+    with closing(sqlite3.connect(STUDENT_LEAVE_DB)) as conn, conn: # closing() closes it; 'with conn' commits/rolls back
+        cursor = conn.execute("UPDATE student_leaves SET status = 'Canceled' WHERE id = ? AND status = 'Pending'", (leave_id,))
+        return cursor.rowcount > 0
+
 def apply_for_student_leave(student_info):
     """Allow parents to apply for leave on behalf of their child"""
     st.header(f"📝 Apply for Leave for {student_info['name']}")
@@ -807,7 +1078,6 @@ def apply_for_student_leave(student_info):
             elif start_date > end_date:
                 st.error("End Date cannot be before Start Date.")
             else:
-                leave_data = load_data(LEAVE_DATA_FILE)
                 new_leave_id = str(uuid.uuid4()) # Use full UUID for leave ID
                 
                 # Calculate leave days (inclusive)
@@ -816,17 +1086,17 @@ def apply_for_student_leave(student_info):
                 # Handle supporting documents
                 doc_paths = []
                 if supporting_docs:
-                    leave_docs_dir = os.path.join(DATA_DIR, "leave_attachments")
-                    os.makedirs(leave_docs_dir, exist_ok=True)
+                    leave_docs_dir = os.path.join(DATA_DIR, "leave_attachments") # Created by ensure_data_dirs()
                     for doc_file in supporting_docs:
                         doc_filename = f"{new_leave_id}_{doc_file.name}"
                         doc_path = os.path.join(leave_docs_dir, doc_filename)
                         try:
+                            doc_file.seek(0)
                             with open(doc_path, "wb") as f:
-                                f.write(doc_file.getvalue())
+                                shutil.copyfileobj(doc_file, f, length=1 << 20) # 1 MiB chunks, no full-size bytes copy
                             doc_paths.append(doc_path)
                         except Exception as e:
-                            st.warning(f"Could not save supporting document {doc.name}: {e}")
+                            st.warning(f"Could not save supporting document {doc_file.name}: {e}")
 
                 # Store leave under a special key for student leaves, or a consolidated structure
                 # Let's use a consolidated structure where 'target_type' differentiates
@@ -849,59 +1119,33 @@ def apply_for_student_leave(student_info):
                     "comments": "" # For admin comments
                 }
 
-                # Ensure 'student_leaves' key exists in leave_data
-                if 'student_leaves' not in leave_data:
-                    leave_data['student_leaves'] = []
-                leave_data['student_leaves'].append(new_leave_record)
-                
-                save_data(leave_data, LEAVE_DATA_FILE)
+                add_student_leave(new_leave_record)
                 st.success("Leave application submitted successfully! Status: Pending review.")
                 st.rerun()
 
     st.markdown("---")
     st.subheader("Your Child's Leave History")
-    leave_data = load_data(LEAVE_DATA_FILE)
-    student_leave_history = []
-
-    if 'student_leaves' in leave_data:
-        for leave in leave_data['student_leaves']:
-            if leave.get('target_id') == student_info['id'] and leave.get('target_type') == 'student':
-                student_leave_history.append({
-                    "Leave ID": leave['id'],
-                    "Type": leave['type'],
-                    "Start Date": leave['start_date'],
-                    "End Date": leave['end_date'],
-                    "Days": leave.get('leave_days', 'N/A'),
-                    "Reason": leave['reason'],
-                    "Status": leave['status'],
-                    "Applied On": leave['application_date']
-                })
-    
-    if student_leave_history:
-        df_leave_history = pd.DataFrame(student_leave_history)
-        df_leave_history['Applied On'] = pd.to_datetime(df_leave_history['Applied On'])
-        df_leave_history = df_leave_history.sort_values(by='Applied On', ascending=False).reset_index(drop=True)
+    # Only this child's rows are read, via the target index
+    df_leave_history = pd.DataFrame(get_student_leaves(student_info['id']))
+
+    if not df_leave_history.empty:
+        df_leave_history = df_leave_history.reindex(columns=list(LEAVE_HISTORY_COLUMNS)).rename(columns=LEAVE_HISTORY_COLUMNS)
+        df_leave_history['Days'] = df_leave_history['Days'].fillna('N/A')
+        df_leave_history = df_leave_history.astype({'Type': 'category', 'Status': 'category'})
+        df_leave_history['Applied On'] = pd.to_datetime(df_leave_history['Applied On'], format='%Y-%m-%d', cache=True)
         st.dataframe(df_leave_history, use_container_width=True)
 
         st.subheader("Cancel Pending Leave Application")
-        pending_leaves = [l for l in student_leave_history if l['Status'] == 'Pending']
-        if pending_leaves:
-            leave_ids_to_cancel = [l['Leave ID'] for l in pending_leaves]
+        leave_ids_to_cancel = df_leave_history.loc[df_leave_history['Status'] == 'Pending', 'Leave ID'].tolist()
+        if leave_ids_to_cancel:
             selected_leave_to_cancel = st.selectbox("Select Leave ID to Cancel", [""] + leave_ids_to_cancel)
 
             if selected_leave_to_cancel:
                 if st.button(f"Confirm Cancel Leave ID: {selected_leave_to_cancel}"):
-                    found_and_canceled = False
-                    if 'student_leaves' in leave_data:
-                        for i, leave_obj in enumerate(leave_data['student_leaves']):
-                            if leave_obj['id'] == selected_leave_to_cancel and leave_obj['status'] == 'Pending':
-                                leave_data['student_leaves'][i]['status'] = 'Canceled'
-                                save_data(leave_data, LEAVE_DATA_FILE)
-                                st.success(f"Leave application {selected_leave_to_cancel} has been canceled.")
-                                found_and_canceled = True
-                                st.rerun()
-                                break
-                    if not found_and_canceled:
+                    if cancel_student_leave(selected_leave_to_cancel):
+                        st.success(f"Leave application {selected_leave_to_cancel} has been canceled.")
+                        st.rerun()
+                    else:
                         st.error("Could not cancel leave. It might not be pending or already processed.")
         else:
             st.info("No pending leave applications to cancel.")
@@ -916,6 +1160,15 @@ def apply_for_student_leave(student_info):
 
 def show():
     """Main function for the parent dashboard"""
+    ensure_data_dirs()
+    retry_failed_writes()
+    try:
+        render_parent_portal()
+    finally:
+        flush_dirty_files() # Runs even when st.rerun() cuts the script short after a save
+
+def render_parent_portal():
+    """Render the login/registration page or the logged-in portal"""
     if 'parent_logged_in' not in st.session_state or not st.session_state['parent_logged_in']:
         parent_login_or_register_page()
         return
@@ -968,7 +1221,7 @@ def show():
 
 def initialize_all_data_files():
     """Initialize all data files with empty structures or sample data if they don't exist"""
-    os.makedirs(DATA_DIR, exist_ok=True)
+    ensure_data_dirs()
 
     # ... (other file initializations) ...
 
@@ -1030,10 +1283,6 @@ def initialize_all_data_files():
     if not os.path.exists(RESOURCES_DATA_FILE):
         save_data(sample_resources, RESOURCES_DATA_FILE)
 
-    # Create attachments directories if they don't exist
-    os.makedirs(os.path.join(DATA_DIR, "attachments"), exist_ok=True)
-    os.makedirs(os.path.join(DATA_DIR, "leave_attachments"), exist_ok=True)
-
     # Create dummy files for sample resources to make them downloadable
     # This loop is now safe because sample_resources is always defined
     for teacher_id, resources_list in sample_resources.items():
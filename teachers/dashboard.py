@@ -2,21 +2,25 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import gzip
 import calendar
 from datetime import datetime, timedelta
 import uuid
 from streamlit_option_menu import option_menu
 import hashlib
+import functools
+import tempfile
+import contextlib
+try:
+    import orjson # Optional faster JSON parser/serializer; stdlib json is used when it is missing
+except ImportError:
+    orjson = None
 
 # ======================
 # DATA MANAGEMENT
 # ======================
 
 DATA_DIR = "data"
-# Ensure data directory and sub-directories exist
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(os.path.join(DATA_DIR, "attachments"), exist_ok=True)
-os.makedirs(os.path.join(DATA_DIR, "leave_attachments"), exist_ok=True)
 
 TEACHER_DATA_FILE = os.path.join(DATA_DIR, "teacher_data.json")
 STUDENT_DATA_FILE = os.path.join(DATA_DIR, "student_data.json")
@@ -27,36 +31,70 @@ TIMETABLE_DATA_FILE = os.path.join(DATA_DIR, "timetable_data.json")
 MESSAGES_DATA_FILE = os.path.join(DATA_DIR, "messages_data.json")
 RESOURCES_DATA_FILE = os.path.join(DATA_DIR, "resources_data.json")
 LEAVE_DATA_FILE = os.path.join(DATA_DIR, "leave_data.json")
+LEAVE_SHARD_DIR = os.path.join(DATA_DIR, "leaves") # One {teacher_id}.json file of leave applications per teacher
 ORDERS_DATA_FILE = os.path.join(DATA_DIR, "orders_data.json")
 
+# Data directory and sub-directories, created by ensure_data_dirs()
+DATA_DIRS = (DATA_DIR, os.path.join(DATA_DIR, "attachments"), os.path.join(DATA_DIR, "leave_attachments"), LEAVE_SHARD_DIR)
+
+@st.cache_resource(show_spinner=False)
+def ensure_data_dirs():
+    """Create the data directories once per process instead of on every script run"""
+    for directory in DATA_DIRS:
+        os.makedirs(directory, exist_ok=True)
+
 # Grade levels and sections for sample data generation
 GRADE_LEVELS = ["Nursery", "LKG", "UKG"] + [f"Grade {i}" for i in range(1, 11)]
 CLASS_SECTIONS = ["A", "B", "C", "D"]
+PRIMARY_GRADES = frozenset({"Nursery", "LKG", "UKG"}) # Grades without sections
 COMMON_SUBJECTS = ["Mathematics", "Science", "English", "History", "Geography", "Computer Science", "Arts", "Physical Education", "Other"]
 
 # ======================
 # HELPER FUNCTIONS
 # ======================
 
+# Each save leaves the previous version's entry behind; cap the cache so stale parses are evicted
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_json_cached(filename, mtime_ns, size):
+    """Parse a JSON file once per (mtime, size); st.cache_data hands each caller its own copy. None for an empty file."""
+    with open(filename, 'rb') as f: # Both parsers take bytes directly, skipping a text decode pass
+        content = f.read()
+    if not content:
+        return None
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
 def load_data(filename, default_value={}):
     """Load data from JSON file, returning a default value if file is empty or corrupted."""
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            try:
-                content = f.read()
-                if content:
-                    return json.loads(content)
-                else:
-                    return default_value
-            except json.JSONDecodeError:
-                st.warning(f"Error decoding JSON from {filename}. File might be corrupted. Re-initializing with default value.")
-                return default_value
-    return default_value
+    try:
+        # Keyed on mtime and size so any save (from this or another module) invalidates the cached parse
+        stat = os.stat(filename)
+        data = _load_json_cached(filename, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return default_value
+    except json.JSONDecodeError: # orjson.JSONDecodeError subclasses this
+        st.warning(f"Error decoding JSON from {filename}. File might be corrupted. Re-initializing with default value.")
+        return default_value
+    return default_value if data is None else data
+
+def dump_json_bytes(data, pretty=True):
+    """Serialize data as JSON; pretty matches json.dump(indent=2) layout, otherwise compact"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS # Non-str keys are stringified like json.dump does
+        return orjson.dumps(data, option=option | orjson.OPT_INDENT_2 if pretty else option)
+    return json.dumps(data, indent=2 if pretty else None, separators=None if pretty else (',', ':')).encode()
 
-def save_data(data, filename):
-    """Save data to JSON file"""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+def save_data(data, filename, pretty=False):
+    """Save data to JSON file atomically (temp file + os.replace), so readers never see a half-written file.
+    Compact by default; pass pretty=True for files the admin also edits by hand."""
+    # Unique temp file per call: every session (and the other dashboards' writers) are threads of one process
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dump_json_bytes(data, pretty))
+        os.replace(tmp_filename, filename)
+    finally:
+        with contextlib.suppress(FileNotFoundError): # Already renamed into place unless the write failed
+            os.remove(tmp_filename)
 
 def load_orders():
     """Load orders data from file."""
@@ -66,20 +104,40 @@ def save_orders(data):
     """Save orders data to file."""
     save_data(data, ORDERS_DATA_FILE)
 
+def load_teacher_leaves(teacher_id):
+    """Load a teacher's leave applications from their shard, falling back to the legacy combined leave file."""
+    shard_file = os.path.join(LEAVE_SHARD_DIR, f"{teacher_id}.json")
+    if os.path.exists(shard_file):
+        return load_data(shard_file, default_value=[])
+    return load_data(LEAVE_DATA_FILE).get(str(teacher_id), [])
+
+def save_teacher_leaves(teacher_id, leaves):
+    """Save a teacher's leave applications to their own shard so other teachers' records are not rewritten."""
+    save_data(leaves, os.path.join(LEAVE_SHARD_DIR, f"{teacher_id}.json"))
+
+PASSWORD_HASH_ITERATIONS = 100_000
+
 def hash_password(password):
-    """Hash a password using SHA-256 for secure storage."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash a password with salted PBKDF2-HMAC-SHA256; stored as 'pbkdf2_sha256$iterations$salt$hash'."""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+    return f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+@functools.lru_cache(maxsize=1)
+def mock_teacher_password_hash():
+    """Hash of the demo teacher's password, derived once per process instead of on every new session"""
+    return hash_password("password123")
+
+# Every class with sections, computed once at import since it depends only on the constants above
+FULL_CLASS_LIST = tuple(
+    grade if grade in PRIMARY_GRADES else f"{grade}{section}"
+    for grade in GRADE_LEVELS
+    for section in (("",) if grade in PRIMARY_GRADES else CLASS_SECTIONS)
+)
 
 def get_full_class_list():
-    """Generate a list of all possible classes"""
-    classes = []
-    for grade in GRADE_LEVELS:
-        if grade in ["Nursery", "LKG", "UKG"]:
-            classes.append(grade)
-        else:
-            for section in CLASS_SECTIONS:
-                classes.append(f"{grade}{section}")
-    return classes
+    """Return the complete list of classes with sections"""
+    return FULL_CLASS_LIST
 
 def get_students_by_class(class_name):
     """Return a list of student records for a given class."""
@@ -111,12 +169,12 @@ def teacher_module():
                 "join_date": "2020-09-01",
                 "is_admin": False,
                 "username": "janedoe",
-                "password": hash_password("password123") # Mock password
+                "password": mock_teacher_password_hash() # Mock password
             }
         }
         all_teachers = load_data(TEACHER_DATA_FILE, default_value={})
         all_teachers.update(mock_teacher_data)
-        save_data(all_teachers, TEACHER_DATA_FILE)
+        save_data(all_teachers, TEACHER_DATA_FILE, pretty=True)
         
         st.session_state['teacher_id'] = teacher_id
         st.session_state['teacher_data'] = mock_teacher_data[teacher_id]
@@ -174,7 +232,7 @@ def teacher_module():
                         
                         all_data = load_data(TEACHER_DATA_FILE)
                         all_data[str(teacher_id)] = teacher_data
-                        save_data(all_data, TEACHER_DATA_FILE)
+                        save_data(all_data, TEACHER_DATA_FILE, pretty=True)
                         st.success("Profile updated successfully")
                         st.rerun()
 
@@ -193,7 +251,7 @@ def teacher_module():
             day = st.selectbox("Day", range(1, 32), index=today.day-1)
         
         selected_date = f"{year}-{month:02d}-{day:02d}"
-        selected_class = st.selectbox("Select Class", get_full_class_list())
+        selected_class = st.selectbox("Select Class", FULL_CLASS_LIST)
         
         students = get_students_by_class(selected_class)
         attendance_data = load_data(ATTENDANCE_DATA_FILE).get(str(teacher_id), {})
@@ -241,7 +299,7 @@ def teacher_module():
                     student_admission_no = st.text_input("Student Admission Number*", help="Unique admission number for the student.").strip()
                     name = st.text_input("Full Name*", help="Full legal name of the student.").strip()
                     roll_no = st.text_input("Roll No.", help="Student's roll number in class (optional).").strip()
-                    class_name = st.selectbox("Class*", get_full_class_list())
+                    class_name = st.selectbox("Class*", FULL_CLASS_LIST)
                     dob = st.date_input("Date of Birth*", max_value=datetime.today().date())
                     date_of_joining = st.date_input("Date of Joining*", max_value=datetime.today().date())
                     date_of_tc = st.date_input("Date of TC (Optional)", value=None, help="Date of Transfer Certificate issuance, if applicable.")
@@ -467,15 +525,18 @@ def teacher_module():
                         if st.button("Import Students", key="import_students_btn_teacher"):
                             student_data = load_data(STUDENT_DATA_FILE)
                             imported_count = 0
+                            # Built once so each row's duplicate check is a set probe instead of a scan of every class
+                            existing_admission_nos = {s.get('admission_no') for cls_students in student_data.values() for s in cls_students}
                             for _, row in df.iterrows():
                                 class_name = row.get('class', 'Unknown Class')
                                 if class_name not in student_data:
                                     student_data[class_name] = []
                                 
                                 admission_no = row.get('admission_no', str(uuid.uuid4()))
-                                if any(s.get('admission_no') == admission_no for cls_students in student_data.values() for s in cls_students):
+                                if admission_no in existing_admission_nos:
                                     st.warning(f"Skipping student with duplicate Admission No: {admission_no}")
                                     continue
+                                existing_admission_nos.add(admission_no)
 
                                 photo_path = None
                                 if row.get('passport_photo_path') and os.path.exists(row['passport_photo_path']):
@@ -579,7 +640,7 @@ def teacher_module():
                     period = st.number_input("Period", min_value=1, max_value=7, value=1)
                     subject = st.text_input("Subject", value=teacher_data.get('subject', ''))
                 with col2:
-                    class_name = st.selectbox("Class", get_full_class_list())
+                    class_name = st.selectbox("Class", FULL_CLASS_LIST)
                     action = st.radio("Action", ["Add/Update", "Delete"])
                 
                 submitted = st.form_submit_button("Submit")
@@ -628,7 +689,7 @@ def teacher_module():
                 title = st.text_input("Assignment Title*")
                 description = st.text_area("Description")
                 due_date = st.date_input("Due Date*", min_value=datetime.today())
-                assigned_class = st.selectbox("Assign to Class*", get_full_class_list())
+                assigned_class = st.selectbox("Assign to Class*", FULL_CLASS_LIST)
                 max_score = st.number_input("Maximum Score*", min_value=1, value=100)
                 assignment_type = st.selectbox("Type", ["Homework", "Project", "Quiz", "Test"])
                 
@@ -779,7 +840,7 @@ def teacher_module():
         with tab1:
             with st.form("enter_marks"):
                 st.subheader("Enter Marks for an Exam/Test")
-                selected_class = st.selectbox("Select Class", get_full_class_list(), key="performance_class")
+                selected_class = st.selectbox("Select Class", FULL_CLASS_LIST, key="performance_class")
                 exam_name = st.text_input("Exam Name (e.g., Mid-Term, Final Exam)")
                 subject = st.selectbox("Subject", COMMON_SUBJECTS)
                 max_marks = st.number_input("Maximum Marks", min_value=1, value=100)
@@ -816,14 +877,17 @@ def teacher_module():
                 df = pd.DataFrame(performance_data)
                 
                 records = []
+                student_names_by_class = {} # class_name -> {student_id: name}, built once per class instead of a scan per mark
                 for _, row in df.iterrows():
+                    student_names = student_names_by_class.get(row['class_name'])
+                    if student_names is None:
+                        student_names = student_names_by_class[row['class_name']] = {s['id']: s.get('name', 'N/A') for s in get_students_by_class(row['class_name'])}
                     for student_id, marks in row['student_marks'].items():
-                        student_info = next((s for s in get_students_by_class(row['class_name']) if s['id'] == student_id), {})
                         records.append({
                             "Exam Name": row['exam_name'],
                             "Subject": row['subject'],
                             "Class": row['class_name'],
-                            "Student Name": student_info.get('name', 'N/A'),
+                            "Student Name": student_names.get(student_id, 'N/A'),
                             "Marks": marks,
                             "Max Marks": row['max_marks'],
                             "Date Recorded": row['date_recorded']
@@ -835,9 +899,11 @@ def teacher_module():
                     
                     selected_student = st.selectbox("Select Student to view trend", [""] + sorted(records_df["Student Name"].unique()))
                     if selected_student:
-                        student_data_trend = records_df[records_df["Student Name"] == selected_student]
-                        student_data_trend["Date Recorded"] = pd.to_datetime(student_data_trend["Date Recorded"])
-                        st.line_chart(student_data_trend.set_index("Date Recorded")[["Marks"]])
+                        # One vectorized mask and a .loc projection of just the plotted columns (no chained-assignment copy)
+                        trend_mask = records_df["Student Name"].to_numpy() == selected_student
+                        student_data_trend = records_df.loc[trend_mask, ["Date Recorded", "Marks"]]
+                        student_data_trend = student_data_trend.assign(**{"Date Recorded": pd.to_datetime(student_data_trend["Date Recorded"])})
+                        st.line_chart(student_data_trend.set_index("Date Recorded"))
     
     # Communication Section
     elif selected == "Communication":
@@ -849,7 +915,7 @@ def teacher_module():
         with tab1:
             with st.form("send_message", clear_on_submit=True):
                 st.subheader("Send a Message to a Parent")
-                students = get_students_by_class(st.selectbox("Select Class", get_full_class_list(), key="msg_class"))
+                students = get_students_by_class(st.selectbox("Select Class", FULL_CLASS_LIST, key="msg_class"))
                 
                 if not students:
                     st.warning("No students in this class to send a message to.")
@@ -972,7 +1038,7 @@ def teacher_module():
         st.header("⏳ Teacher Leave Management")
         tab1, tab2 = st.tabs(["Apply for Leave", "Leave History"])
         
-        leave_data = load_data(LEAVE_DATA_FILE).get(str(teacher_id), [])
+        leave_data = load_teacher_leaves(teacher_id)
 
         with tab1:
             with st.form("apply_leave", clear_on_submit=True):
@@ -1008,9 +1074,7 @@ def teacher_module():
                             "submission_date": str(datetime.today().date())
                         }
                         leave_data.append(new_leave_request)
-                        all_data = load_data(LEAVE_DATA_FILE)
-                        all_data[str(teacher_id)] = leave_data
-                        save_data(all_data, LEAVE_DATA_FILE)
+                        save_teacher_leaves(teacher_id, leave_data)
                         st.success("Leave application submitted successfully! It is now pending admin approval.")
                         st.rerun()
 
@@ -1041,7 +1105,7 @@ def teacher_module():
         
         st.subheader("Profile Data")
         if st.button("Download Profile Data (JSON)"):
-            profile_json = json.dumps(teacher_data, indent=2)
+            profile_json = dump_json_bytes(teacher_data)
             st.download_button(
                 label="Download JSON",
                 data=profile_json,
@@ -1057,21 +1121,26 @@ def teacher_module():
                 for date, classes in attendance_data.items():
                     for class_name, students in classes.items():
                         for student_id, status in students.items():
-                            student_info = next((s for s in get_students_by_class(class_name) if s['id'] == student_id), {})
                             records.append({
                                 "Date": date,
                                 "Class": class_name,
-                                "Student Name": student_info.get('name', 'N/A'),
-                                "Admission No": student_info.get('admission_no', 'N/A'),
+                                "Student ID": student_id,
                                 "Status": status
                             })
                 df_attendance = pd.DataFrame(records)
+                # Enrich with student details through plain dict maps instead of a per-row class scan
+                all_students = [s for students in load_data(STUDENT_DATA_FILE).values() for s in students]
+                name_map = {s['id']: s.get('name', 'N/A') for s in all_students}
+                admission_map = {s['id']: s.get('admission_no', 'N/A') for s in all_students}
+                df_attendance["Student Name"] = df_attendance["Student ID"].map(name_map).fillna('N/A')
+                df_attendance["Admission No"] = df_attendance["Student ID"].map(admission_map).fillna('N/A')
+                df_attendance = df_attendance[["Date", "Class", "Student Name", "Admission No", "Status"]]
                 csv = df_attendance.to_csv(index=False).encode('utf-8')
                 st.download_button(
                     "Download Attendance Data",
-                    csv,
-                    "attendance_export.csv",
-                    "text/csv"
+                    gzip.compress(csv, compresslevel=1),
+                    "attendance_export.csv.gz",
+                    "application/gzip"
                 )
             else:
                 st.info("No attendance data to export.")
@@ -1136,6 +1205,7 @@ def show():
         page_icon="👨‍🏫",
         layout="wide"
     )
+    ensure_data_dirs()
     teacher_module()
 
 if __name__ == "__main__":